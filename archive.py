@@ -0,0 +1,302 @@
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+
+# Sort order of the rows in a segment, every prefix of it is a contiguous range
+SORT_KEYS = ("run", "ev", "sim_day", "event")
+
+# Columns copied from every log entry
+BASE_COLUMNS = {
+    "run": np.int32,
+    "ev": np.int32,
+    "sim_day": np.int32,
+    "event": np.int16,
+    "day": np.int32,
+    "time": np.float64,
+    "sim_hour": np.int8,
+    "sim_minute": np.float64,
+    "seq": np.int64  # Position of the entry in the logs, the tiebreak of events at the same time
+}
+
+RUN_PATTERN = re.compile(r"_run_(\d+)")
+
+def _scenario_of(file):
+    # Same scenario grouping as plotting.py
+    return file.split("_run")[0]
+
+def _segment_directory(archive_directory, scenario):
+    return os.path.join(archive_directory, scenario)
+
+def build_archive(log_directory="logs", archive_directory=os.path.join("logs", "archive")):
+    """
+    Convert the JSON logs of a sweep into a memory-mapped, indexed event archive.
+
+    Every scenario becomes one segment: a directory with one .npy file per column,
+    sorted by (run, ev, sim_day, event, time, seq), plus a secondary index sorted by event type.
+    Only one scenario is held in memory while building.
+
+    :param log_directory: Directory with the "_logs.json" files.
+    :param archive_directory: Output directory of the archive.
+    :return: The list of archived scenarios.
+    """
+    # Group the log files by scenario
+    scenario_groups = defaultdict(list)
+    for file in sorted(os.listdir(log_directory)):
+        if file.endswith("_logs.json"):
+            scenario_groups[_scenario_of(file)].append(file)
+
+    os.makedirs(archive_directory, exist_ok=True)
+    for scenario, files in scenario_groups.items():
+        _build_segment(log_directory, _segment_directory(archive_directory, scenario), files)
+
+    # Top-level metadata of the archive
+    with open(os.path.join(archive_directory, "archive.json"), "w") as f:
+        json.dump({"scenarios": list(scenario_groups.keys())}, f, indent=4)
+
+    return list(scenario_groups.keys())
+
+def _build_segment(log_directory, segment_directory, files):
+    columns = defaultdict(list)
+    extra_columns = defaultdict(list)
+    events = {}  # Event name -> code
+    ev_ids = {}  # EV UUID -> code
+    runs = {}  # Run number -> source file
+    n_rows = 0
+
+    for position, file in enumerate(files):
+        match = RUN_PATTERN.search(file)
+        run = int(match.group(1)) if match else position + 1
+        runs[run] = file
+
+        with open(os.path.join(log_directory, file), "r") as f:
+            logs = json.load(f)
+
+        for log in logs:
+            columns["run"].append(run)
+            columns["ev"].append(ev_ids.setdefault(log["ev_id"], len(ev_ids)))
+            columns["sim_day"].append(log["sim_day"])
+            columns["event"].append(events.setdefault(log["event"], len(events)))
+            columns["day"].append(log["day"])
+            columns["time"].append(log["time"])
+            columns["sim_hour"].append(log["sim_hour"])
+            columns["sim_minute"].append(log["sim_minute"])
+            columns["seq"].append(n_rows)
+
+            # Every key of 'extra' becomes its own float column, NaN where it is missing
+            extra = log.get("extra") or {}
+            for key in extra.keys() - extra_columns.keys():
+                extra_columns[key] = [np.nan] * n_rows
+            for key, values in extra_columns.items():
+                values.append(extra.get(key, np.nan))
+            n_rows += 1
+
+    arrays = {name: np.array(values, dtype=BASE_COLUMNS[name]) for name, values in columns.items()}
+    arrays.update({name: np.array(values, dtype=np.float64) for name, values in extra_columns.items()})
+
+    # Sort the rows by (run, ev, sim_day, event) with the time and log position as tiebreaks,
+    # lexsort takes the last key as the primary one
+    order = np.lexsort([arrays["seq"], arrays["time"]] + [arrays[key] for key in reversed(SORT_KEYS)])
+
+    os.makedirs(segment_directory, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(segment_directory, f"{name}.npy"), values[order])
+
+    # Secondary index: row positions sorted by event type (then by the primary order),
+    # with the range of every event type, so event queries skip all other rows
+    event_sorted = arrays["event"][order]
+    by_event = np.argsort(event_sorted, kind="stable").astype(np.int64)
+    np.save(os.path.join(segment_directory, "by_event.npy"), by_event)
+    bounds = np.searchsorted(event_sorted[by_event], np.arange(len(events) + 1))
+
+    ev_table = np.empty(len(ev_ids), dtype="S36")
+    for ev_id, code in ev_ids.items():
+        ev_table[code] = ev_id
+    np.save(os.path.join(segment_directory, "ev_ids.npy"), ev_table)
+
+    with open(os.path.join(segment_directory, "segment.json"), "w") as f:
+        json.dump({
+            "rows": n_rows,
+            "events": list(events.keys()),
+            "event_ranges": {name: [int(bounds[code]), int(bounds[code + 1])] for name, code in events.items()},
+            "runs": {str(run): file for run, file in runs.items()},
+            "columns": list(arrays.keys())
+        }, f, indent=4)
+
+class Segment:
+    def __init__(self, segment_directory):
+        """
+        Initialize the Segment class, the memory-mapped events of one scenario.
+
+        :param segment_directory: Directory of the segment.
+        """
+        self.directory = segment_directory
+        with open(os.path.join(segment_directory, "segment.json"), "r") as f:
+            self.meta = json.load(f)
+        self.event_codes = {name: code for code, name in enumerate(self.meta["events"])}
+        self._columns = {}
+        self._ev_codes = None
+
+    def column(self, name):
+        """
+        Get a column as a read-only memory map (nothing is read until it is sliced).
+
+        :param name: The column name.
+        :return: The memory-mapped column.
+        """
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    def ev_code(self, ev):
+        """
+        Get the code of an EV in this segment.
+
+        :param ev: The EV UUID, or its integer code.
+        :return: The integer code, or None if the EV is not in the segment.
+        """
+        if isinstance(ev, (int, np.integer)):
+            return int(ev)
+        if self._ev_codes is None:
+            self._ev_codes = {value.decode(): code for code, value in enumerate(self.column("ev_ids"))}
+        return self._ev_codes.get(str(ev))
+
+    def row_range(self, run=None, ev=None, sim_day=None, event=None):
+        """
+        Find the contiguous row range of a query on the sort keys.
+
+        The range is narrowed with binary searches along the sort order for as long as the
+        keys are given, the remaining keys are returned as filters.
+
+        :return: Tuple of (start, stop, remaining filters as {column: code}).
+        """
+        ev_code = self.ev_code(ev) if ev is not None else None
+        codes = {
+            "run": run,
+            "ev": -1 if ev is not None and ev_code is None else ev_code,  # Unknown EVs match no rows
+            "sim_day": sim_day,
+            "event": self.event_codes.get(event, -1) if event is not None else None
+        }
+
+        start, stop = 0, self.meta["rows"]
+        remaining = {}
+        for key in SORT_KEYS:
+            value = codes[key]
+            if value is None:
+                # Sort order is broken from here on, the later keys become filters
+                remaining = {k: codes[k] for k in SORT_KEYS[SORT_KEYS.index(key) + 1:] if codes[k] is not None}
+                break
+            values = self.column(key)[start:stop]
+            start, stop = start + np.searchsorted(values, value, "left"), start + np.searchsorted(values, value, "right")
+        return int(start), int(stop), remaining
+
+class EventArchive:
+    def __init__(self, archive_directory=os.path.join("logs", "archive")):
+        """
+        Initialize the EventArchive class.
+
+        :param archive_directory: Directory written by build_archive.
+        """
+        self.directory = archive_directory
+        with open(os.path.join(archive_directory, "archive.json"), "r") as f:
+            self.scenarios = json.load(f)["scenarios"]
+        self._segments = {}
+
+    def segment(self, scenario):
+        """
+        Get the segment of a scenario.
+
+        :param scenario: The scenario name (e.g. "simulation_1").
+        :return: The Segment.
+        """
+        if scenario not in self._segments:
+            self._segments[scenario] = Segment(_segment_directory(self.directory, scenario))
+        return self._segments[scenario]
+
+    def select(self, scenario, run=None, ev=None, sim_day=None, event=None, columns=None):
+        """
+        Select the events of a scenario by run, EV, simulation day and event type.
+
+        When the given keys form a prefix of (run, ev, sim_day, event) the result is a zero-copy
+        view of the memory-mapped columns; otherwise only the narrowed range is read and filtered.
+
+        :param scenario: The scenario name.
+        :param run: The run number.
+        :param ev: The EV UUID or code.
+        :param sim_day: The simulation day.
+        :param event: The event type (e.g. "requesting charger").
+        :param columns: Columns to return, all columns by default.
+        :return: Dictionary of column name -> array.
+        """
+        segment = self.segment(scenario)
+        columns = columns or segment.meta["columns"]
+        start, stop, remaining = segment.row_range(run, ev, sim_day, event)
+
+        if not remaining:
+            return {name: segment.column(name)[start:stop] for name in columns}
+
+        mask = np.ones(stop - start, dtype=bool)
+        for key, value in remaining.items():
+            mask &= segment.column(key)[start:stop] == value
+        return {name: segment.column(name)[start:stop][mask] for name in columns}
+
+    def event_rows(self, scenario, event, columns):
+        """
+        Select all events of one type in a scenario through the event index.
+
+        :param scenario: The scenario name.
+        :param event: The event type.
+        :param columns: Columns to return.
+        :return: Dictionary of column name -> array, in (run, ev, sim_day) order.
+        """
+        segment = self.segment(scenario)
+        start, stop = segment.meta["event_ranges"].get(event, [0, 0])
+        rows = segment.column("by_event")[start:stop]
+        return {name: segment.column(name)[rows] for name in columns}
+
+    def to_dataframe(self, scenario, **query):
+        """
+        Select events (see select) as a DataFrame in the load_logs layout.
+
+        The segment order groups the events of an EV-day by event type, the rows are
+        returned in log order per run and EV instead (by time, then by log position).
+
+        :param scenario: The scenario name.
+        :return: DataFrame with the event names, EV UUIDs and source files decoded.
+        """
+        segment = self.segment(scenario)
+        df = pd.DataFrame(self.select(scenario, **query))
+        df = df.sort_values(["run", "ev", "time", "seq"], ignore_index=True).drop(columns="seq")
+        df["event"] = np.array(segment.meta["events"])[df["event"]]
+        df["ev_id"] = segment.column("ev_ids")[df.pop("ev")].astype(str)
+        df["source_file"] = df.pop("run").astype(str).map(segment.meta["runs"])
+        return df
+
+    def hourly_counts(self, scenario, event):
+        """
+        Count the events of one type per day and hour, as in hourly_arrival_count_avg_by_scenario.
+
+        Only the day and hour columns of the matching rows are read.
+
+        :param scenario: The scenario name.
+        :param event: The event type.
+        :return: DataFrame with one row per day and one column per hour of the day.
+        """
+        rows = self.event_rows(scenario, event, ["day", "sim_hour"])
+        days = np.asarray(rows["day"])
+        if len(days) == 0:
+            return pd.DataFrame()
+
+        counts = np.zeros((days.max() + 1, 24), dtype=np.int64)
+        np.add.at(counts, (days, np.asarray(rows["sim_hour"])), 1)
+        pivot = pd.DataFrame(counts, columns=pd.Index(range(24), name="sim_hour"))
+        pivot.index.name = "day"
+        # Same shape as the pivot in plotting.py: only days and hours that occur
+        return pivot.loc[counts.sum(axis=1) > 0, counts.sum(axis=0) > 0]
+
+if __name__ == "__main__":
+    # Build the archive from the default "logs" directory
+    scenarios = build_archive()
+    print(f"Archived {len(scenarios)} scenarios: {', '.join(scenarios)}")
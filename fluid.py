@@ -0,0 +1,230 @@
+import math
+import os
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from instrumentation import RunInstrumentation
+from surrogate import load_model
+
+def truncated_exponential_mean(mean, low, high):
+    """
+    Get the mean of an exponential distribution truncated to [low, high].
+
+    :param mean: Mean of the untruncated distribution.
+    :param low: Lower bound.
+    :param high: Upper bound.
+    :return: The truncated mean.
+    """
+    rate = 1 / mean
+    mass_low, mass_high = math.exp(-rate * low), math.exp(-rate * high)
+    return (low * mass_low - high * mass_high) / (mass_low - mass_high) + mean
+
+def delivery_density(model, dt=1.0):
+    """
+    Discretize the delivery (return delay) density of get_delivery_time on a minute grid.
+
+    :param model: The simulator module.
+    :param dt: Time step in minutes.
+    :return: Array with the probability of returning in each step after the start of the workday.
+    """
+    rate = 1 / (model.LAMBDA_ARRIVAL * 60)
+    low, high = 360, 600  # Default bounds of get_delivery_time
+    edges = np.arange(0, high + dt, dt)
+    # Truncated exponential CDF evaluated on the step edges
+    cdf = (np.exp(-rate * low) - np.exp(-rate * np.clip(edges, low, high))) / (np.exp(-rate * low) - np.exp(-rate * high))
+    return np.diff(cdf)
+
+def run_fluid(service_rate, servers, ev_count, sim_days=None, dt=1.0, diffusion=True):
+    """
+    Integrate a fluid (optionally Gaussian diffusion) approximation of the daily
+    delivery -> queue -> charge cycle of run_simulation.
+
+    Every workday start, the idle EVs leave for delivery and return with the truncated exponential
+    delivery time of get_delivery_time. Returned EVs join the charger system, which serves at rate
+    mu * E[min(X, c)] with mu from the truncated charging time of ChargerAttributes.charging_time.
+    EVs that finish charging wait for the next workday start, as in wait_until_next_day.
+    With diffusion, the number X of EVs at the chargers is treated as Gaussian with a variance
+    from the linear noise approximation, so queueing also shows up before the fluid saturates.
+    The cost only depends on the number of time steps, not on the fleet size.
+
+    :param service_rate: The charger service rate (mean charging time in hours).
+    :param servers: The number of chargers.
+    :param ev_count: Number of EVs in the fleet.
+    :param sim_days: Number of days to integrate, SIM_DAYS by default.
+    :param dt: Time step in minutes.
+    :param diffusion: Use the Gaussian diffusion correction, False for the plain fluid model.
+    :return: DataFrame with one row per (day, sim_hour): arrivals, mean queue length, busy chargers and wait (hours).
+    """
+    model = load_model()
+    sim_days = sim_days or model.SIM_DAYS
+
+    # Service rate per minute from the truncated charging time (min 5 minutes, max 2880 minutes)
+    mu = 1 / truncated_exponential_mean(service_rate * 60, 5, 2880)
+    density = delivery_density(model, dt)
+    c = servers
+
+    steps_per_day = int(round(1440 / dt))
+    start_step = int(round(model.WORKDAY_START / dt))
+    n_steps = sim_days * steps_per_day
+
+    # Expected arrivals, queue length and busy chargers per step
+    arrivals = np.zeros(n_steps + len(density))
+    queue = np.zeros(n_steps)
+    busy = np.zeros(n_steps)
+
+    x, v = 0.0, 0.0  # Mean and variance of the number of EVs at the chargers (queue + service)
+    idle = float(ev_count)  # EVs waiting for the next workday start
+
+    for step in range(n_steps):
+        if step % steps_per_day == start_step:
+            # Workday start: every idle EV leaves for delivery and returns following the delivery density
+            arrivals[step:step + len(density)] += idle * density
+            idle = 0.0
+
+        # Expected queue length and busy chargers
+        sigma = math.sqrt(v) if diffusion else 0.0
+        if sigma > 1e-9:
+            z = (x - c) / sigma
+            queued = (x - c) * _normal_cdf(z) + sigma * _normal_pdf(z)
+            below = _normal_cdf(-z)  # P(X < c), the sensitivity of the busy chargers to x
+        else:
+            queued = max(x - c, 0.0)
+            below = 1.0 if x < c else 0.0
+        serving = x - queued
+
+        # Euler step of the mean and (linear noise) variance
+        departures = mu * serving * dt
+        x = max(x + arrivals[step] - departures, 0.0)
+        if diffusion:
+            v = max(v + (arrivals[step] + departures) - 2 * mu * below * v * dt, 0.0)
+        idle += departures
+
+        queue[step] = queued
+        busy[step] = serving
+
+    # Aggregate the steps per day and hour, matching the heatmaps of plotting.py
+    steps = np.arange(n_steps)
+    df = pd.DataFrame({
+        "day": steps // steps_per_day,
+        "sim_hour": ((steps * dt) // 60 % 24).astype(int),
+        "arrivals": arrivals[:n_steps],
+        "queue_length": queue,
+        "busy_chargers": busy
+    })
+    hourly = df.groupby(["day", "sim_hour"]).agg(
+        arrivals=("arrivals", "sum"),
+        queue_length=("queue_length", "mean"),
+        busy_chargers=("busy_chargers", "mean")
+    ).reset_index()
+    # Virtual queue wait of an arrival: the queue ahead served at the full charger rate
+    hourly["wait_hours"] = hourly["queue_length"] / (c * mu) / 60
+    return hourly
+
+def _normal_cdf(z):
+    # math.erf is much faster than scipy.stats.norm for the scalars of the integration loop
+    return 0.5 * (1 + math.erf(z / math.sqrt(2)))
+
+def _normal_pdf(z):
+    return math.exp(-0.5 * z * z) / math.sqrt(2 * math.pi)
+
+def hourly_profile(hourly):
+    """
+    Average a per-(day, hour) table over the days.
+
+    :param hourly: DataFrame with "day" and "sim_hour" columns.
+    :return: DataFrame indexed by hour of day.
+    """
+    return hourly.drop(columns="day").groupby("sim_hour").mean()
+
+def simulate_hourly(service_rate, servers, ev_count, sim_days=None, sim_runs=5):
+    """
+    Run the simulator and measure the same per-hour quantities as run_fluid.
+
+    :param service_rate: The charger service rate (mean charging time in hours).
+    :param servers: The number of chargers.
+    :param ev_count: Number of EVs in the fleet.
+    :param sim_days: Number of workdays per EV, SIM_DAYS by default.
+    :param sim_runs: Number of replications.
+    :return: DataFrame indexed by hour of day with arrivals per day, queue length seen by arrivals and mean wait (hours).
+    """
+    model = load_model()
+    sim_days = sim_days or model.SIM_DAYS
+    charger_type = model.ChargerAttributes(service_rate, servers)
+
+    frames = []
+    for run in range(sim_runs):
+        # Reset the global EV logs for each replication
+        model.ev_logs = []
+        env, fleet = model.create_environment(run + 1, charger_type, ev_count, sim_days=sim_days)
+        model.run_environment(env, RunInstrumentation(enabled=False))
+        logs = pd.DataFrame(model.ev_logs)
+        logs["run"] = run
+        frames.append(logs)
+    logs = pd.concat(frames, ignore_index=True)
+
+    # Queue wait of every EV-day, attributed to the hour of the request
+    keys = ["run", "ev_id", "day"]
+    requested = logs[logs["event"] == "requesting charger"].set_index(keys)
+    started = logs[logs["event"] == "starts charging"].set_index(keys)["time"]
+    requested["wait_hours"] = (started - requested["time"]) / 60
+    requested["queue_length"] = requested["extra"].apply(lambda extra: extra["queue_length"])
+
+    n_days = logs.groupby("run")["sim_day"].max().sum()  # Calendar days simulated over all runs
+    grouped = requested.groupby("sim_hour")
+    return pd.DataFrame({
+        "arrivals": grouped.size() / n_days,
+        "queue_length": grouped["queue_length"].mean(),
+        "wait_hours": grouped["wait_hours"].mean()
+    }).reindex(range(24)).fillna({"arrivals": 0})  # Queue and wait are only observed in hours with arrivals
+
+def validate_against_simulation(service_rate, servers, ev_count=None, sim_days=None, sim_runs=5, save_dir="output"):
+    """
+    Compare the fluid approximation with run_simulation at small scale.
+
+    Note that the simulator's queue length is the queue seen by arriving EVs,
+    the fluid queue length is the time average over the hour.
+
+    :param service_rate: The charger service rate (mean charging time in hours).
+    :param servers: The number of chargers.
+    :param ev_count: Number of EVs in the fleet, EVS by default.
+    :param sim_days: Number of days, SIM_DAYS by default.
+    :param sim_runs: Number of simulator replications.
+    :param save_dir: Directory for the comparison figure and CSV.
+    :return: Tuple of (per-hour comparison DataFrame, dictionary of RMSE per quantity).
+    """
+    model = load_model()
+    ev_count = ev_count or model.EVS
+    sim_days = sim_days or model.SIM_DAYS
+
+    fluid = hourly_profile(run_fluid(service_rate, servers, ev_count, sim_days))
+    simulated = simulate_hourly(service_rate, servers, ev_count, sim_days, sim_runs)
+    comparison = fluid[["arrivals", "queue_length", "wait_hours"]].join(simulated, lsuffix="_fluid", rsuffix="_sim")
+
+    quantities = ["arrivals", "queue_length", "wait_hours"]
+    # Mean over the hours with observations, the squared errors of unobserved hours are NaN and skipped
+    rmse = {q: float(np.sqrt(((comparison[f"{q}_fluid"] - comparison[f"{q}_sim"]) ** 2).mean())) for q in quantities}
+
+    # Save the comparison table and plot the hourly curves
+    os.makedirs(save_dir, exist_ok=True)
+    name = f"fluid_validation_mu_{service_rate}_cap_{servers}_evs_{ev_count}"
+    comparison.to_csv(os.path.join(save_dir, f"{name}.csv"))
+
+    fig, axes = plt.subplots(1, len(quantities), figsize=(len(quantities) * 6, 4), squeeze=False)
+    for ax, q in zip(axes[0], quantities):
+        ax.plot(comparison.index, comparison[f"{q}_sim"], marker="o", label=f"Simulation ({sim_runs} runs)")
+        ax.plot(comparison.index, comparison[f"{q}_fluid"], label="Fluid approximation")
+        ax.set_title(f"{q} (RMSE={rmse[q]:.3f})")
+        ax.set_xlabel("Hour of Day")
+        ax.grid(True)
+        ax.legend(fontsize="small")
+    plt.tight_layout()
+    plt.savefig(os.path.join(save_dir, f"{name}.png"))
+    plt.close()
+
+    return comparison, rmse
+
+if __name__ == "__main__":
+    # Validate the approximation at the scale of the simulation scenarios
+    for service_rate, servers in [(2.85, 4), (2.85, 8), (0.5, 1)]:
+        comparison, rmse = validate_against_simulation(service_rate, servers)
+        print(f"mu={service_rate}, c={servers}: RMSE {rmse}")
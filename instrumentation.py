@@ -0,0 +1,187 @@
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+class RunInstrumentation:
+    def __init__(self, enabled=True, profile=False, trace_memory=False, output_dir="logs", top_stats=10):
+        """
+        Initialize the RunInstrumentation class.
+
+        Instrumentation is opt-in: a disabled instance accepts every call but records nothing,
+        so callers can use it unconditionally without paying for the bookkeeping.
+
+        :param enabled: Whether phase timings and counters are recorded at all.
+        :param profile: Capture a cProfile snapshot for every replication.
+        :param trace_memory: Capture a tracemalloc snapshot for every replication.
+        :param output_dir: Directory where profiles, snapshots and the manifest are written.
+        :param top_stats: Number of top allocation sites kept in the manifest per replication.
+        """
+        self.enabled = enabled
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.output_dir = output_dir
+        self.top_stats = top_stats
+        self.phases = {}  # Phase name -> accumulated wall time, calls and events
+        self.counters = {}  # Counter name -> accumulated count (work that is not timed as a phase)
+        self.replications = []  # One record per replication (wall time, phases, snapshot files)
+        self.parameters = {}  # Run parameters copied into the manifest
+        self.created = time.time()
+        self._current = None  # Replication record currently being filled
+
+    def _phase_record(self, phases, name):
+        # Create the phase entry on first use
+        return phases.setdefault(name, {"wall_time": 0.0, "calls": 0, "events": 0})
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a named phase (e.g. "setup", "simulate", "serialize").
+
+        :param name: The phase name.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            # Accumulate into the run totals and into the active replication, if any
+            targets = [self.phases]
+            if self._current is not None:
+                targets.append(self._current["phases"])
+            for phases in targets:
+                record = self._phase_record(phases, name)
+                record["wall_time"] += elapsed
+                record["calls"] += 1
+
+    def add_events(self, name, count):
+        """
+        Add a number of processed events to a phase.
+
+        :param name: The phase name.
+        :param count: The number of events processed.
+        """
+        if not self.enabled:
+            return
+
+        targets = [self.phases]
+        if self._current is not None:
+            targets.append(self._current["phases"])
+        for phases in targets:
+            self._phase_record(phases, name)["events"] += count
+
+    def count(self, name, count=1):
+        """
+        Add to a plain counter, for work that is counted but not timed (e.g. logged EV events).
+
+        :param name: The counter name.
+        :param count: The amount to add.
+        """
+        if not self.enabled:
+            return
+
+        targets = [self.counters]
+        if self._current is not None:
+            targets.append(self._current["counters"])
+        for counters in targets:
+            counters[name] = counters.get(name, 0) + count
+
+    @contextmanager
+    def replication(self, label):
+        """
+        Instrument one replication, optionally capturing cProfile and tracemalloc snapshots.
+
+        :param label: Label used for the snapshot file names (e.g. "simulation_1_run_3").
+        """
+        if not self.enabled:
+            yield
+            return
+
+        record = {"label": label, "wall_time": 0.0, "phases": {}, "counters": {}}
+        self._current = record
+
+        # Start the optional profilers
+        profiler = cProfile.Profile() if self.profile else None
+        started_tracing = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        if profiler:
+            profiler.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["wall_time"] = time.perf_counter() - start
+            os.makedirs(self.output_dir, exist_ok=True)
+
+            if profiler:
+                profiler.disable()
+                profile_file = os.path.join(self.output_dir, f"{label}.prof")
+                profiler.dump_stats(profile_file)
+                record["profile_file"] = profile_file
+
+            if self.trace_memory and tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                snapshot_file = os.path.join(self.output_dir, f"{label}.tracemalloc")
+                snapshot.dump(snapshot_file)
+                record["memory"] = {
+                    "current_bytes": current,
+                    "peak_bytes": peak,
+                    "snapshot_file": snapshot_file,
+                    "top_allocations": [
+                        {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+                        for stat in snapshot.statistics("lineno")[:self.top_stats]
+                    ]
+                }
+                if started_tracing:
+                    tracemalloc.stop()
+
+            self.replications.append(record)
+            self._current = None
+
+    def manifest(self):
+        """
+        Build the machine-readable run manifest.
+
+        :return: A JSON-serializable dictionary.
+        """
+        finished = time.time()
+        return {
+            "created": self.created,
+            "finished": finished,
+            "python": sys.version,
+            "platform": platform.platform(),
+            "argv": sys.argv,
+            "parameters": self.parameters,
+            "total_wall_time": finished - self.created,
+            "phases": self.phases,
+            "counters": self.counters,
+            "replications": self.replications
+        }
+
+    def write_manifest(self, filename):
+        """
+        Write the run manifest as JSON into the output directory.
+
+        :param filename: The manifest file name.
+        :return: The path of the written manifest, or None when instrumentation is disabled.
+        """
+        if not self.enabled:
+            return None
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        output_file = os.path.join(self.output_dir, filename)
+        with open(output_file, "w") as f:
+            json.dump(self.manifest(), f, indent=4, default=str)
+        return output_file
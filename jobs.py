@@ -0,0 +1,299 @@
+import asyncio
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from surrogate import load_model, simulate_replications
+
+# Fields that identify a scenario, replications of equal scenarios are shared between jobs
+SCENARIO_FIELDS = ("service_rate", "servers", "ev_count", "sim_days", "power_kw")
+
+def normalize_spec(spec):
+    """
+    Fill in the defaults of a scenario spec.
+
+    :param spec: Dictionary with "service_rate" and "servers", and optionally "ev_count",
+        "sim_days", "power_kw" and "sim_runs".
+    :return: The completed spec.
+    """
+    model = load_model()
+    return {
+        "service_rate": float(spec["service_rate"]),
+        "servers": int(spec["servers"]),
+        "ev_count": int(spec.get("ev_count", model.EVS)),
+        "sim_days": int(spec.get("sim_days", model.SIM_DAYS)),
+        "power_kw": spec.get("power_kw"),
+        "sim_runs": int(spec.get("sim_runs", model.SIM_RUNS))
+    }
+
+def scenario_key(spec):
+    """
+    Get the key identifying the scenario of a normalized spec (everything except the number of runs).
+
+    :param spec: A normalized scenario spec.
+    :return: Tuple of the scenario fields.
+    """
+    return tuple(spec[field] for field in SCENARIO_FIELDS)
+
+def run_replications(key, indices):
+    """
+    Run a batch of replications of one scenario. Executed in the process pool.
+
+    The logs are summarized in the worker and nothing is written under logs/.
+
+    :param key: The scenario key (see scenario_key).
+    :param indices: The replication indices to run.
+    :return: List of run summaries (see surrogate.summarize_run), in the order of `indices`.
+    """
+    spec = dict(zip(SCENARIO_FIELDS, key))
+    return simulate_replications(spec["service_rate"], spec["servers"], spec["ev_count"], indices,
+                                 sim_days=spec["sim_days"], power_kw=spec["power_kw"])
+
+class Replication:
+    def __init__(self, key, index):
+        """
+        Initialize the Replication class, one shared unit of work.
+
+        :param key: The scenario key.
+        :param index: The replication index within the scenario.
+        """
+        self.key = key
+        self.index = index
+        self.future = asyncio.get_running_loop().create_future()  # Resolves to the run summary
+        self.subscribers = set()  # Jobs waiting for this replication
+        self.batch = None  # Tuple of (executor future, replications) of the batch, once dispatched
+
+class Job:
+    def __init__(self, service, spec, replications):
+        """
+        Initialize the Job class, the handle returned to a caller of WhatIfService.submit.
+
+        :param service: The WhatIfService that owns the job.
+        :param spec: The normalized scenario spec.
+        :param replications: The Replication objects the job waits for.
+        """
+        self.service = service
+        self.spec = spec
+        self.replications = replications
+        self.completed = 0
+        self._updates = asyncio.Queue()  # Progress updates, None marks the end
+        self._task = asyncio.ensure_future(self._collect())
+
+    async def _collect(self):
+        try:
+            # Shield the shared futures so cancelling this job does not cancel them for other jobs
+            for future in asyncio.as_completed([asyncio.shield(r.future) for r in self.replications]):
+                await future
+                self.completed += 1
+                self._updates.put_nowait({"completed": self.completed, "total": len(self.replications)})
+            return aggregate_summaries(self.spec, [r.future.result() for r in self.replications])
+        finally:
+            self._updates.put_nowait(None)
+
+    async def result(self):
+        """
+        Wait for the job to finish.
+
+        :return: The aggregated result (see aggregate_summaries).
+        """
+        return await self._task
+
+    async def progress(self):
+        """
+        Stream the progress of the job.
+
+        :return: Async iterator of {"completed", "total"} dictionaries, ending when the job finishes.
+        """
+        while True:
+            update = await self._updates.get()
+            if update is None:
+                return
+            yield update
+
+    def cancel(self):
+        """Cancel the job. Replications no other job is waiting for are not run."""
+        if self._task.cancel():
+            self.service._release(self)
+
+    def done(self):
+        """
+        Check if the job has finished or was cancelled.
+
+        :return: True if the job is done.
+        """
+        return self._task.done()
+
+def aggregate_summaries(spec, summaries):
+    """
+    Combine the run summaries of a job.
+
+    :param spec: The normalized scenario spec.
+    :param summaries: List of run summaries.
+    :return: Dictionary with the mean and standard deviation of E[Wq] and P(wait) across the runs.
+    """
+    wq = np.array([s["wq_hours"] for s in summaries])
+    pw = np.array([s["prob_wait"] for s in summaries])
+    return {
+        "spec": spec,
+        "n_runs": len(summaries),
+        "E[Wq] (hrs)": float(wq.mean()),
+        "E[Wq] std (hrs)": float(wq.std(ddof=1)) if len(wq) > 1 else None,
+        "Prob_Wait": float(pw.mean()),
+        "Prob_Wait std": float(pw.std(ddof=1)) if len(pw) > 1 else None,
+        "replications": summaries
+    }
+
+class WhatIfService:
+    def __init__(self, max_workers=None, batch_window=0.05, batch_size=5, executor=None):
+        """
+        Initialize the WhatIfService class.
+
+        In-process asyncio job API around the simulator. Replications are shared between jobs
+        with the same scenario (a job asking for 10 runs reuses the 5 another job already asked for),
+        collected for `batch_window` seconds and dispatched in batches to a process pool.
+
+        :param max_workers: Number of worker processes (ignored if `executor` is given).
+        :param batch_window: Seconds to wait for more requests before dispatching.
+        :param batch_size: Largest number of replications per dispatched batch.
+        :param executor: Optional concurrent.futures executor to use instead of a new process pool.
+        """
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self._owns_executor = executor is None
+        self._executor = executor or ProcessPoolExecutor(max_workers=max_workers)
+        self._replications = {}  # (scenario key, index) -> Replication, kept as a result cache
+        self._pending = []  # Replications waiting to be dispatched
+        self._wakeup = None
+        self._dispatcher = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def submit(self, spec):
+        """
+        Submit a scenario. Must be called from a running event loop.
+
+        :param spec: The scenario spec (see normalize_spec).
+        :return: A Job handle.
+        """
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        spec = normalize_spec(spec)
+        key = scenario_key(spec)
+
+        replications = []
+        for index in range(spec["sim_runs"]):
+            replication = self._replications.get((key, index))
+            if replication is None:
+                # New unit of work, queue it for the next batch
+                replication = Replication(key, index)
+                self._replications[(key, index)] = replication
+                self._pending.append(replication)
+                self._wakeup.set()
+            replications.append(replication)
+
+        job = Job(self, spec, replications)
+        for replication in replications:
+            replication.subscribers.add(job)
+        return job
+
+    async def run(self, spec):
+        """
+        Submit a scenario and wait for the result.
+
+        :param spec: The scenario spec (see normalize_spec).
+        :return: The aggregated result (see aggregate_summaries).
+        """
+        return await self.submit(spec).result()
+
+    def _release(self, job):
+        # Drop the work of a cancelled job that nobody else is waiting for
+        for replication in job.replications:
+            replication.subscribers.discard(job)
+
+        for replication in job.replications:
+            if replication.subscribers or replication.future.done():
+                continue
+            if replication in self._pending:
+                self._pending.remove(replication)
+                self._evict(replication)
+            elif replication.batch is not None:
+                future, batch = replication.batch
+                if any(r.subscribers for r in batch):
+                    # Other jobs still need the batch, keep the result for the cache
+                    continue
+                # Only stops the batch if the pool has not started it yet, its result is dropped either way
+                future.cancel()
+                for other in batch:
+                    self._evict(other)
+
+    def _evict(self, replication):
+        # Cancel an unresolved replication and forget it, so a later request runs it again
+        if not replication.future.done():
+            replication.future.cancel()
+            self._replications.pop((replication.key, replication.index), None)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            # Collect more requests before dispatching
+            await asyncio.sleep(self.batch_window)
+            self._wakeup.clear()
+            pending, self._pending = self._pending, []
+
+            # Group the replications by scenario and split them into batches
+            by_scenario = {}
+            for replication in pending:
+                by_scenario.setdefault(replication.key, []).append(replication)
+            for key, replications in by_scenario.items():
+                for start in range(0, len(replications), self.batch_size):
+                    batch = replications[start:start + self.batch_size]
+                    future = loop.run_in_executor(self._executor, run_replications, key, [r.index for r in batch])
+                    for replication in batch:
+                        replication.batch = (future, batch)
+                    asyncio.ensure_future(self._deliver(batch, future))
+
+    async def _deliver(self, batch, future):
+        try:
+            summaries = await future
+        except asyncio.CancelledError:
+            for replication in batch:
+                self._evict(replication)
+            return
+        except Exception as e:
+            for replication in batch:
+                if not replication.future.done():
+                    replication.future.set_exception(e)
+                # Forget failed replications so a later request runs them again
+                self._replications.pop((replication.key, replication.index), None)
+            return
+
+        for replication, summary in zip(batch, summaries):
+            if not replication.future.done():
+                replication.future.set_result(summary)
+
+    async def close(self):
+        """Stop the dispatcher and shut down the process pool."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    async def main():
+        # Two overlapping requests: the second reuses the 3 replications of the first
+        async with WhatIfService(max_workers=4) as service:
+            first = service.submit({"service_rate": 2.85, "servers": 4, "sim_runs": 3})
+            second = service.submit({"service_rate": 2.85, "servers": 4, "sim_runs": 6})
+            async for update in second.progress():
+                print(f"Progress: {update['completed']}/{update['total']}")
+            for job in (first, second):
+                result = await job.result()
+                print(f"{result['n_runs']} runs: E[Wq] = {result['E[Wq] (hrs)']:.2f} hrs, P(wait) = {result['Prob_Wait']:.3f}")
+
+    asyncio.run(main())
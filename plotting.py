@@ -1,5 +1,7 @@
+import hashlib
 import json
 import os
+import sys
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
@@ -9,6 +11,7 @@ import random
 import math
 from scipy.stats import kstest
 from collections import defaultdict
+from instrumentation import RunInstrumentation
 
 def load_logs(log_directory="logs"):
     # Get a list of all files in the specified directory that end with "_logs.json"
@@ -263,18 +266,11 @@ def hourly_arrival_count_avg_by_scenario(df, event_filter="arrival", save_dir="o
         base = sim.split("_run")[0]  # Customize if your filenames vary
         scenario_groups[base].append(sim)
 
-    # Determine the number of scenarios and layout for subplots
-    scenarios = list(scenario_groups.keys())
-    cols = 2  # Number of columns in the subplot grid
-    rows = math.ceil(len(scenarios) / cols)  # Number of rows in the subplot grid
-
-    # Create a figure with subplots
-    fig, axes = plt.subplots(rows, cols, figsize=(cols * 6, rows * 4), squeeze=False)
-
-    # Iterate over each scenario to generate heatmaps
-    for idx, scenario in enumerate(scenarios):
+    # Count the events of every scenario by day and hour
+    pivots = {}
+    for scenario, files in scenario_groups.items():
         # Filter the DataFrame for the current scenario
-        sim_df = df[df['source_file'].isin(scenario_groups[scenario])]
+        sim_df = df[df['source_file'].isin(files)]
         if event_filter:
             # Further filter by the specified event type
             sim_df = sim_df[sim_df['event'] == event_filter]
@@ -283,7 +279,32 @@ def hourly_arrival_count_avg_by_scenario(df, event_filter="arrival", save_dir="o
         grouped = sim_df.groupby(["day", "sim_hour"]).size().reset_index(name="count")
 
         # Pivot the grouped data to create a heatmap-friendly format
-        pivot = grouped.pivot(index="day", columns="sim_hour", values="count").fillna(0)
+        pivots[scenario] = grouped.pivot(index="day", columns="sim_hour", values="count").fillna(0)
+
+    plot_hourly_heatmaps(pivots, event_filter, save_dir)
+
+def plot_hourly_heatmaps(pivots, event_filter, save_dir="output"):
+    """
+    Plot one day-by-hour heatmap of event counts per scenario.
+
+    :param pivots: Dictionary of scenario -> DataFrame with one row per day and one column per hour.
+    :param event_filter: The counted event type, used in the titles and the file name.
+    :param save_dir: Directory for the figure.
+    """
+    # Ensure the output directory exists
+    os.makedirs(save_dir, exist_ok=True)
+
+    # Determine the number of scenarios and layout for subplots
+    scenarios = list(pivots.keys())
+    cols = 2  # Number of columns in the subplot grid
+    rows = math.ceil(len(scenarios) / cols)  # Number of rows in the subplot grid
+
+    # Create a figure with subplots
+    fig, axes = plt.subplots(rows, cols, figsize=(cols * 6, rows * 4), squeeze=False)
+
+    # Iterate over each scenario to generate heatmaps
+    for idx, scenario in enumerate(scenarios):
+        pivot = pivots[scenario]
 
         # Select the appropriate subplot axis
         ax = axes[idx // cols][idx % cols]
@@ -306,38 +327,40 @@ def hourly_arrival_count_avg_by_scenario(df, event_filter="arrival", save_dir="o
     plt.savefig(out_path)
     plt.close()
 
+def erlang_c_metrics(lambda_rate, mu_rate, c):
+    a = lambda_rate / mu_rate  # Calculate the offered load
+    rho = a / c  # Utilization factor (traffic intensity per server)
+
+    # Calculate the denominator of the Erlang C formula
+    sum_terms = sum([(a ** k) / math.factorial(k) for k in range(c)])  # Sum of terms for k < c
+    last_term = (a ** c) / (math.factorial(c) * (1 - rho))  # Last term for k = c
+    denom = sum_terms + last_term  # Total denominator
+
+    # Calculate the probability of waiting (Erlang C formula)
+    pw = last_term / denom
+
+    # Calculate the expected waiting time in the queue
+    ewq = pw / (c * mu_rate - lambda_rate)  # Expected queue wait time
+    ew = ewq + 1 / mu_rate  # Total expected wait time (queue + service)
+
+    # Return the results for this number of chargers
+    return {
+        "lambda_rate": lambda_rate,  # Arrival rate
+        "mu_rate": mu_rate,  # Service rate
+        "c": c,  # Number of chargers
+        "ErlangC_Prob_Wait": pw,  # Probability of waiting
+        "E[Wq] (hrs)": ewq,  # Expected queue wait time in hours
+        "E[W_total] (hrs)": ew,  # Total expected wait time in hours
+        "Utilization": rho  # Utilization factor
+    }
+
 def erlang_c(scenario, lambda_rate, mu_rate, chargers=4):
     # Dictionary to store results for each number of chargers
     output_data = {}
     
     # Iterate over the number of chargers from 1 to the specified maximum
     for c in range(1, chargers + 1):
-        a = lambda_rate / mu_rate  # Calculate the offered load
-        rho = a / c  # Utilization factor (traffic intensity per server)
-
-        # Calculate the denominator of the Erlang C formula
-        sum_terms = sum([(a ** k) / math.factorial(k) for k in range(c)])  # Sum of terms for k < c
-        last_term = (a ** c) / (math.factorial(c) * (1 - rho))  # Last term for k = c
-        denom = sum_terms + last_term  # Total denominator
-
-        # Calculate the probability of waiting (Erlang C formula)
-        pw = last_term / denom
-
-        # Calculate the expected waiting time in the queue
-        ewq = pw / (c * mu_rate - lambda_rate)  # Expected queue wait time
-        ew = ewq + 1 / mu_rate  # Total expected wait time (queue + service)
-
-        # Store results for the current number of chargers
-        results = {
-            "lambda_rate": lambda_rate,  # Arrival rate
-            "mu_rate": mu_rate,  # Service rate
-            "c": c,  # Number of chargers
-            "ErlangC_Prob_Wait": pw,  # Probability of waiting
-            "E[Wq] (hrs)": ewq,  # Expected queue wait time in hours
-            "E[W_total] (hrs)": ew,  # Total expected wait time in hours
-            "Utilization": rho  # Utilization factor
-        }
-        output_data[f"c_{c}"] = results  # Add results to the output dictionary
+        output_data[f"c_{c}"] = erlang_c_metrics(lambda_rate, mu_rate, c)  # Add results to the output dictionary
 
     # Ensure the output directory exists
     os.makedirs("output", exist_ok=True)
@@ -357,18 +380,39 @@ def calculate_poisson_rates_avg_by_scenario(df, save_dir="logs"):
         base = sim.split("_run")[0]  # Extract the base scenario name from the file name
         scenario_groups[base].append(sim)
 
-    results = []  # Initialize a list to store results for each scenario
-
-    # Iterate over each scenario and its associated runs
+    # Mean arrival and service time of every run, grouped by scenario
+    scenario_runs = {}
     for scenario, runs in scenario_groups.items():
-        run_stats = []  # List to store per-run statistics
+        scenario_runs[scenario] = []
 
         # Process each run in the current scenario
         for sim in runs:
             sub_df = df[df['source_file'] == sim]  # Filter the DataFrame for the current run
             mean_arrival_time = sub_df['return_delay'].dropna().mean() / 60  # Calculate mean arrival time in hours
             mean_service_time = sub_df['charging_time'].dropna().mean() / 60  # Calculate mean service time in hours
+            scenario_runs[scenario].append((mean_arrival_time, mean_service_time))
+
+    return summarize_poisson_rates(scenario_runs, save_dir)
+
+def summarize_poisson_rates(scenario_runs, save_dir="logs"):
+    """
+    Average the per-run Poisson rates by scenario, run the Erlang C calculations and save the summary.
+
+    :param scenario_runs: Dictionary of scenario -> list of (mean arrival time, mean service time) in hours, one per run.
+    :param save_dir: Directory for poisson_rates_summary_avg.csv.
+    :return: DataFrame with one row per scenario.
+    """
+    # Ensure the output directory exists
+    os.makedirs(save_dir, exist_ok=True)
+
+    results = []  # Initialize a list to store results for each scenario
+
+    # Iterate over each scenario and its associated runs
+    for scenario, runs in scenario_runs.items():
+        run_stats = []  # List to store per-run statistics
 
+        # Process each run in the current scenario
+        for mean_arrival_time, mean_service_time in runs:
             # Calculate arrival rate (lambda), service rate (mu), and utilization (rho)
             lambda_rate = 1 / mean_arrival_time if mean_arrival_time else None
             mu_rate = 1 / mean_service_time if mean_service_time else None
@@ -413,37 +457,417 @@ def calculate_poisson_rates_avg_by_scenario(df, save_dir="logs"):
     # Return the results DataFrame
     return results_df
 
-if __name__ == "__main__":
-    # Load logs from the default "logs" directory and convert them into a DataFrame
-    df = load_logs()
-    print(f"Loaded {len(df)} logs from {len(df['source_file'].unique())} files.")
-    
-    # Unpack the 'extra' column into separate columns for easier analysis
-    df = unpack_extra(df)
-    
-    # Plot histograms for the 'return_delay' column, grouped by scenario, with a bin width of 5 minutes
-    plot_histograms_by_sim_combined_avg_by_scenario(df, 'return_delay', binwidth=5)
-    # Plot histograms for the 'charging_time' column, grouped by scenario, with a bin width of 30 minutes
-    plot_histograms_by_sim_combined_avg_by_scenario(df, 'charging_time', binwidth=30)
-    
-    # Fit and plot distributions for the 'return_delay' column, grouped by scenario, with a bin width of 5 minutes
-    fit_and_plot_distributions_combined_avg_by_scenario(df, 'return_delay', binwidth=5)
-    # Fit and plot distributions for the 'charging_time' column, grouped by scenario, with a bin width of 30 minutes
-    fit_and_plot_distributions_combined_avg_by_scenario(df, 'charging_time', binwidth=30)
-    
-    # Compare the 'return_delay' column to a truncated exponential distribution with lambda=10.375
-    # compare_to_truncated_exponential_avg_by_scenario(df, col_name="return_delay", lam=10.375, binwidth=30)
-    compare_to_truncated_exponential_avg_by_scenario(df, col_name="return_delay", lam=10.375, binwidth=30, normalize="min_max")
-    
-    # Generate heatmaps for hourly arrival counts of events filtered by "requesting charger"
-    hourly_arrival_count_avg_by_scenario(df, event_filter="requesting charger") 
-    hourly_arrival_count_avg_by_scenario(df, event_filter="starts charging")
-    
-    # Calculate Poisson rates (arrival and service rates) for each scenario and save the summary
-    rate_summary = calculate_poisson_rates_avg_by_scenario(df)
-    
-    # Print the summary of calculated rates
-    print(rate_summary)
+def mser_truncation(series, batch_size=5):
+    """
+    Find the warm-up period of an output series with the MSER-m rule (Marginal Standard Error Rule).
+
+    The series is averaged in non-overlapping batches of `batch_size` observations and the
+    truncation point minimizing the marginal standard error of the remaining batches is returned.
+    Only the first half of the series is considered as a truncation point.
+
+    :param series: Sequence of observations in time order (e.g. daily mean waiting times).
+    :param batch_size: Number of observations per MSER batch (5 gives the usual MSER-5).
+    :return: The number of leading observations to delete.
+    """
+    values = np.asarray(series, dtype=float)
+    n_batches = len(values) // batch_size
+    if n_batches < 2:
+        return 0
+
+    # Average the series in batches of `batch_size` observations
+    batches = values[:n_batches * batch_size].reshape(n_batches, batch_size).mean(axis=1)
+
+    best_d, best_stat = 0, float("inf")
+    for d in range(n_batches // 2):
+        remaining = batches[d:]
+        # MSER statistic: sum of squared deviations divided by the squared number of remaining batches
+        stat = np.sum((remaining - remaining.mean()) ** 2) / len(remaining) ** 2
+        if stat < best_stat:
+            best_d, best_stat = d, stat
+
+    return best_d * batch_size
+
+def batch_means(values, n_batches=10, confidence=0.95):
+    """
+    Estimate the mean of a correlated series and its confidence interval with batch means.
+
+    :param values: Sequence of observations in time order (after warm-up deletion).
+    :param n_batches: Number of non-overlapping batches.
+    :param confidence: Confidence level of the interval.
+    :return: Tuple of (mean, half-width), the half-width is None if there are fewer than 2 batches.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    batch_size = len(values) // n_batches if n_batches else 0
+    if batch_size < 1 or n_batches < 2:
+        return (values.mean() if len(values) else None), None
+
+    batches = values[:n_batches * batch_size].reshape(n_batches, batch_size).mean(axis=1)
+    half_width = stats.t.ppf((1 + confidence) / 2, n_batches - 1) * batches.std(ddof=1) / math.sqrt(n_batches)
+    return batches.mean(), half_width
+
+def calculate_steady_state_rates_by_scenario(df, n_batches=10, mser_batch_size=5, confidence=0.95, save_dir="logs"):
+    """
+    Steady-state counterpart of calculate_poisson_rates_avg_by_scenario for one long run per scenario.
+
+    Daily (workday) estimates of the arrival rate, service rate, utilization and queue wait are
+    computed, the warm-up days are detected with MSER on the daily mean queue wait and deleted,
+    and the remaining days are grouped into batch means to obtain confidence intervals.
+
+    :param df: DataFrame of unpacked logs (see load_logs and unpack_extra), e.g. from logs/steady_state.
+    :param n_batches: Number of batches for the batch means.
+    :param mser_batch_size: Batch size of the MSER warm-up detection.
+    :param confidence: Confidence level of the intervals.
+    :param save_dir: Directory for the summary CSV.
+    :return: DataFrame with one row per scenario.
+    """
+    # Ensure the output directory exists
+    os.makedirs(save_dir, exist_ok=True)
+
+    # Group simulation files by scenario
+    scenario_groups = defaultdict(list)
+    for sim in df['source_file'].unique():
+        base = sim.split("_run")[0]  # Extract the base scenario name from the file name
+        scenario_groups[base].append(sim)
+
+    results = []  # Initialize a list to store results for each scenario
+
+    for scenario, runs in scenario_groups.items():
+        sub_df = df[df['source_file'].isin(runs)]
+
+        # Daily mean delivery and charging times, in hours
+        delivery = sub_df.dropna(subset=['return_delay']).groupby('day')['return_delay'].mean() / 60
+        service = sub_df.dropna(subset=['charging_time']).groupby('day')['charging_time'].mean() / 60
+
+        # Queue wait of every EV-day: time from requesting a charger until charging starts
+        keys = ['source_file', 'ev_id', 'day']
+        requested = sub_df[sub_df['event'] == "requesting charger"].groupby(keys)['time'].first()
+        started = sub_df[sub_df['event'] == "starts charging"].groupby(keys)['time'].first()
+        wait = (started - requested).dropna() / 60  # Queue wait in hours
+        daily_wait = wait.groupby(level='day').mean()
+        daily_prob_wait = (wait > 0).groupby(level='day').mean()
+
+        # Align the daily series on the workdays present in the run
+        daily = pd.DataFrame({
+            "lambda": 1 / delivery,
+            "mu": 1 / service,
+            "wq": daily_wait,
+            "prob_wait": daily_prob_wait
+        }).sort_index()
+        daily["rho"] = daily["lambda"] / daily["mu"]
+
+        # Detect and delete the warm-up period on the queue wait, the quantity affected by the empty start
+        warmup_days = mser_truncation(daily["wq"].fillna(0).values, batch_size=mser_batch_size)
+        steady = daily.iloc[warmup_days:]
+
+        lambda_mean, lambda_hw = batch_means(steady["lambda"], n_batches, confidence)
+        mu_mean, mu_hw = batch_means(steady["mu"], n_batches, confidence)
+        rho_mean, rho_hw = batch_means(steady["rho"], n_batches, confidence)
+        wq_mean, wq_hw = batch_means(steady["wq"], n_batches, confidence)
+        pw_mean, pw_hw = batch_means(steady["prob_wait"], n_batches, confidence)
+
+        # Perform Erlang C calculations for the scenario
+        if lambda_mean and mu_mean:
+            erlang_c(scenario=f"{scenario}_steady_state", lambda_rate=lambda_mean, mu_rate=mu_mean, chargers=4)
+
+        # Same columns as the replication summary, plus the steady-state diagnostics
+        results.append({
+            "scenario": scenario,
+            "mean_lambda (1/lambda) (arrivals/hr)": lambda_mean,
+            "mean_lambda_rate (arrivals/hrs)": 1 / lambda_mean if lambda_mean else None,
+            "mean_mu (services/hr)": mu_mean,
+            "mean_mu_rate (1/mu) (services/hrs)": 1 / mu_mean if mu_mean else None,
+            "mean_rho (utilization)": rho_mean,
+            "n_runs": len(runs),
+            "lambda_ci_halfwidth": lambda_hw,
+            "mu_ci_halfwidth": mu_hw,
+            "rho_ci_halfwidth": rho_hw,
+            "mean_wq (hrs)": wq_mean,
+            "wq_ci_halfwidth": wq_hw,
+            "prob_wait": pw_mean,
+            "prob_wait_ci_halfwidth": pw_hw,
+            "warmup_days": warmup_days,
+            "steady_state_days": len(steady),
+            "n_batches": n_batches,
+            "batch_size_days": len(steady) // n_batches
+        })
+
+    # Convert the results to a DataFrame
+    results_df = pd.DataFrame(results)
+
+    # Save the results to a CSV file in the specified directory
+    out_path = os.path.join(save_dir, "steady_state_rates_summary.csv")
+    results_df.to_csv(out_path, index=False)
+
+    return results_df
+
+# Histogram bin widths (minutes) and heatmap events of the analysis, shared by the full and incremental modes
+HISTOGRAM_BINWIDTHS = {"return_delay": 5, "charging_time": 30}
+HEATMAP_EVENTS = ["requesting charger", "starts charging"]
+
+def file_aggregates(path):
+    """
+    Compute the partial aggregates of one log file that the incremental analysis merges.
+
+    :param path: Path of the log file.
+    :return: Dictionary with per-column counts, sums and histogram bins, and per-event day/hour counts.
+    """
+    with open(path, 'r') as f:
+        logs = json.load(f)
+
+    columns = {col: {"count": 0, "sum": 0.0, "bins": defaultdict(int)} for col in HISTOGRAM_BINWIDTHS}
+    hourly = {event: defaultdict(int) for event in HEATMAP_EVENTS}
+
+    for log in logs:
+        extra = log.get("extra") or {}
+        for col, binwidth in HISTOGRAM_BINWIDTHS.items():
+            value = extra.get(col)
+            if value is not None:
+                columns[col]["count"] += 1
+                columns[col]["sum"] += value
+                columns[col]["bins"][str(int(value // binwidth))] += 1
+        if log["event"] in hourly:
+            hourly[log["event"]][f"{log['day']},{log['sim_hour']}"] += 1
+
+    return {"n_events": len(logs), "columns": columns, "hourly": hourly}
+
+def update_analysis_cache(log_directory="logs", cache_directory=os.path.join("logs", "analysis_cache")):
+    """
+    Bring the cached per-file aggregates up to date with the log directory.
+
+    Files are matched on size and modification time first, and on their SHA-256 hash when those changed,
+    so only new or modified files are read. Entries of deleted files are dropped.
+
+    :param log_directory: Directory with the "_logs.json" files.
+    :param cache_directory: Directory of the manifest and the cached aggregates.
+    :return: Tuple of (dictionary of file -> aggregates, list of files that were (re)processed).
+    """
+    os.makedirs(cache_directory, exist_ok=True)
+    manifest_file = os.path.join(cache_directory, "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+
+    log_files = sorted(f for f in os.listdir(log_directory) if f.endswith("_logs.json"))
+    aggregates = {}
+    processed = []
+
+    for file in log_files:
+        path = os.path.join(log_directory, file)
+        stat = os.stat(path)
+        entry = manifest.get(file)
+        cache_file = os.path.join(cache_directory, file.replace("_logs.json", "_aggregates.json"))
+
+        # Only hash the file when its size or modification time changed
+        if entry is not None and (entry["size"], entry["mtime"]) == (stat.st_size, stat.st_mtime):
+            sha256 = entry["sha256"]
+        else:
+            sha256 = _file_hash(path)
+        unchanged = entry is not None and entry["sha256"] == sha256 and os.path.exists(cache_file)
+
+        if unchanged:
+            with open(cache_file, 'r') as f:
+                aggregates[file] = json.load(f)
+        else:
+            aggregates[file] = file_aggregates(path)
+            with open(cache_file, 'w') as f:
+                json.dump(aggregates[file], f)
+            processed.append(file)
+
+        manifest[file] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+
+    # Forget the files that were removed from the log directory
+    for file in set(manifest) - set(log_files):
+        del manifest[file]
+        stale = os.path.join(cache_directory, file.replace("_logs.json", "_aggregates.json"))
+        if os.path.exists(stale):
+            os.remove(stale)
+        processed.append(file)
+
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+    return aggregates, processed
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def plot_binned_histograms_by_scenario(aggregates, col_name, binwidth=5, save_dir="output"):
+    """
+    Plot the combined histograms of a column by scenario from cached histogram bins.
+    Incremental counterpart of plot_histograms_by_sim_combined_avg_by_scenario.
 
-    erlang_c(scenario="sim_7", lambda_rate=0.1271374552791245, mu_rate=0.3418786506112975, chargers=8)
-    erlang_c(scenario="sim_8", lambda_rate=0.12700111182366441, mu_rate=0.34105399812107806, chargers=8)
\ No newline at end of file
+    :param aggregates: Dictionary of file -> aggregates (see update_analysis_cache).
+    :param col_name: The column ("return_delay" or "charging_time").
+    :param binwidth: The bin width the aggregates were computed with.
+    :param save_dir: Directory for the figure.
+    """
+    # Ensure the output directory exists
+    os.makedirs(save_dir, exist_ok=True)
+
+    # Merge the bins of all files of each scenario
+    scenario_bins = defaultdict(lambda: defaultdict(int))
+    scenario_files = defaultdict(int)
+    for file, aggregate in aggregates.items():
+        base = file.split("_run")[0]  # Extract the base scenario name from the file name
+        scenario_files[base] += 1
+        for bin_index, count in aggregate["columns"][col_name]["bins"].items():
+            scenario_bins[base][int(bin_index)] += count
+
+    # Set the number of columns and calculate the required rows for subplots
+    scenarios = list(scenario_files.keys())
+    cols = 2
+    rows = math.ceil(len(scenarios) / cols)
+
+    # Create a figure with subplots
+    fig, axes = plt.subplots(rows, cols, figsize=(cols * 6, rows * 4), squeeze=False)
+
+    for idx, scenario in enumerate(scenarios):
+        bins = scenario_bins[scenario]
+        ax = axes[idx // cols][idx % cols]  # Select the appropriate subplot axis
+
+        # Skip if there is no data for the current scenario
+        if not bins:
+            ax.set_visible(False)
+            continue
+
+        # Plot the histogram with the bin counts as weights of the bin centers, on the cached bin edges
+        indices = np.array(sorted(bins))
+        centers = (indices + 0.5) * binwidth
+        counts = np.array([bins[b] for b in indices])
+        binrange = (indices[0] * binwidth, (indices[-1] + 1) * binwidth)
+        # The KDE needs more than one distinct value
+        sns.histplot(x=centers, weights=counts, binwidth=binwidth, binrange=binrange, kde=len(indices) > 1, ax=ax)
+        ax.set_title(f"{col_name} - {scenario} (Avg of {scenario_files[scenario]} runs)")
+        ax.set_xlabel(f"{col_name} (minutes)")
+        ax.set_ylabel("Count")
+        ax.grid(True)  # Add a grid for better readability
+
+    # Hide unused subplots if the grid is larger than the number of scenarios
+    for i in range(len(scenarios), rows * cols):
+        fig.delaxes(axes[i // cols][i % cols])
+
+    # Adjust layout and save the figure to the specified directory
+    plt.tight_layout()
+    plt.savefig(os.path.join(save_dir, f"combined_{col_name}_histograms.png"))
+    plt.close()
+
+def run_incremental_analysis(log_directory="logs", cache_directory=os.path.join("logs", "analysis_cache"), save_dir="output"):
+    """
+    Update the histograms, heatmaps, Poisson rate summary and Erlang C results from cached per-file aggregates.
+
+    Only new or changed log files are read. Distribution fits and the truncated exponential
+    comparison need the raw samples and are only produced by the full analysis.
+
+    :param log_directory: Directory with the "_logs.json" files.
+    :param cache_directory: Directory of the manifest and the cached aggregates.
+    :param save_dir: Directory for the figures.
+    :return: The Poisson rate summary DataFrame, or None if nothing changed.
+    """
+    aggregates, processed = update_analysis_cache(log_directory, cache_directory)
+    print(f"Processed {len(processed)} new or changed of {len(aggregates)} log files.")
+    if not processed:
+        return None
+
+    # Histograms from the merged bins
+    for col_name, binwidth in HISTOGRAM_BINWIDTHS.items():
+        plot_binned_histograms_by_scenario(aggregates, col_name, binwidth=binwidth, save_dir=save_dir)
+
+    # Heatmaps from the merged day/hour counts
+    for event_filter in HEATMAP_EVENTS:
+        scenario_counts = defaultdict(lambda: defaultdict(int))
+        for file, aggregate in aggregates.items():
+            for key, count in aggregate["hourly"][event_filter].items():
+                day_index, hour_index = (int(x) for x in key.split(","))
+                scenario_counts[file.split("_run")[0]][(day_index, hour_index)] += count
+        pivots = {}
+        for scenario, counts in scenario_counts.items():
+            grouped = pd.DataFrame([(d, h, c) for (d, h), c in counts.items()], columns=["day", "sim_hour", "count"])
+            pivots[scenario] = grouped.pivot(index="day", columns="sim_hour", values="count").fillna(0)
+        plot_hourly_heatmaps(pivots, event_filter, save_dir)
+
+    # Poisson rates from the per-file sums and counts
+    scenario_runs = defaultdict(list)
+    for file, aggregate in aggregates.items():
+        means = [c["sum"] / c["count"] / 60 if c["count"] else float("nan") for c in
+                 (aggregate["columns"]["return_delay"], aggregate["columns"]["charging_time"])]
+        scenario_runs[file.split("_run")[0]].append(tuple(means))
+    return summarize_poisson_rates(scenario_runs)
+
+if __name__ == "__main__":
+    # Record per-phase timings, and optionally a cProfile/tracemalloc snapshot, of the pipeline (written next to the logs).
+    # The profilers distort the phase timings, so each one is switched on separately
+    TIMING = False
+    PROFILE = False
+    TRACE_MEMORY = False
+    instrument = RunInstrumentation(enabled=TIMING or PROFILE or TRACE_MEMORY, profile=PROFILE, trace_memory=TRACE_MEMORY)
+
+    # Only reprocess new or changed log files with: python plotting.py --incremental
+    INCREMENTAL = "--incremental" in sys.argv
+
+    with instrument.replication("plotting"):
+        if INCREMENTAL:
+            with instrument.phase("incremental"):
+                rate_summary = run_incremental_analysis()
+            if rate_summary is not None:
+                print(rate_summary)
+        else:
+            # Load logs from the default "logs" directory and convert them into a DataFrame
+            with instrument.phase("load_logs"):
+                df = load_logs()
+            instrument.add_events("load_logs", len(df))
+            print(f"Loaded {len(df)} logs from {len(df['source_file'].unique())} files.")
+        
+            # Unpack the 'extra' column into separate columns for easier analysis
+            with instrument.phase("unpack_extra"):
+                df = unpack_extra(df)
+        
+            with instrument.phase("histograms"):
+                # Plot histograms for the 'return_delay' column, grouped by scenario, with a bin width of 5 minutes
+                plot_histograms_by_sim_combined_avg_by_scenario(df, 'return_delay', binwidth=5)
+                # Plot histograms for the 'charging_time' column, grouped by scenario, with a bin width of 30 minutes
+                plot_histograms_by_sim_combined_avg_by_scenario(df, 'charging_time', binwidth=30)
+        
+            with instrument.phase("fit_distributions"):
+                # Fit and plot distributions for the 'return_delay' column, grouped by scenario, with a bin width of 5 minutes
+                fit_and_plot_distributions_combined_avg_by_scenario(df, 'return_delay', binwidth=5)
+                # Fit and plot distributions for the 'charging_time' column, grouped by scenario, with a bin width of 30 minutes
+                fit_and_plot_distributions_combined_avg_by_scenario(df, 'charging_time', binwidth=30)
+        
+            with instrument.phase("compare_truncated_exponential"):
+                # Compare the 'return_delay' column to a truncated exponential distribution with lambda=10.375
+                # compare_to_truncated_exponential_avg_by_scenario(df, col_name="return_delay", lam=10.375, binwidth=30)
+                compare_to_truncated_exponential_avg_by_scenario(df, col_name="return_delay", lam=10.375, binwidth=30, normalize="min_max")
+        
+            with instrument.phase("heatmaps"):
+                # Generate heatmaps for hourly arrival counts of events filtered by "requesting charger"
+                hourly_arrival_count_avg_by_scenario(df, event_filter="requesting charger") 
+                hourly_arrival_count_avg_by_scenario(df, event_filter="starts charging")
+        
+            # Calculate Poisson rates (arrival and service rates) for each scenario and save the summary
+            with instrument.phase("poisson_rates"):
+                rate_summary = calculate_poisson_rates_avg_by_scenario(df)
+        
+            # Print the summary of calculated rates
+            print(rate_summary)
+
+            with instrument.phase("erlang_c"):
+                erlang_c(scenario="sim_7", lambda_rate=0.1271374552791245, mu_rate=0.3418786506112975, chargers=8)
+                erlang_c(scenario="sim_8", lambda_rate=0.12700111182366441, mu_rate=0.34105399812107806, chargers=8)
+
+            # Steady-state estimates from the single long runs, if any were made (ESTIMATION_MODE = "steady_state")
+            steady_state_dir = os.path.join("logs", "steady_state")
+            if os.path.isdir(steady_state_dir):
+                with instrument.phase("steady_state"):
+                    steady_df = unpack_extra(load_logs(steady_state_dir))
+                    steady_summary = calculate_steady_state_rates_by_scenario(steady_df)
+                print(steady_summary)
+
+    # Write the run manifest next to the logs
+    manifest_file = instrument.write_manifest("plotting_manifest.json")
+    if manifest_file: print(f"Run manifest saved to {manifest_file}")
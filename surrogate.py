@@ -0,0 +1,313 @@
+import importlib.util
+import json
+import math
+import os
+import re
+import numpy as np
+from collections import defaultdict
+from instrumentation import RunInstrumentation
+from plotting import erlang_c_metrics
+
+# Path of the production simulator (the file name is not importable with a plain import)
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sys6034-model-final.py")
+
+# Log file naming used by run_simulation
+LOG_FILE_PATTERN = re.compile(r"simulation_(\d+)_run_(\d+)_mu_([\d.]+)_cap_(\d+)_logs\.json$")
+
+_model = None
+
+def load_model(verbose=False):
+    """
+    Load sys6034-model-final.py as a module.
+
+    :param verbose: Value for the model's VERBOSE flag (the per-event prints).
+    :return: The simulator module.
+    """
+    global _model
+    if _model is None:
+        spec = importlib.util.spec_from_file_location("sys6034_model_final", MODEL_FILE)
+        _model = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(_model)
+    _model.VERBOSE = verbose
+    return _model
+
+def summarize_run(logs, service_rate, servers):
+    """
+    Summarize the queue performance of one replication.
+
+    :param logs: List of logged EV events of the run.
+    :param service_rate: The charger service rate (mean charging time in hours).
+    :param servers: The number of chargers.
+    :return: Dictionary with the scenario parameters, mean queue wait (hours) and probability of waiting.
+    """
+    requested = {}
+    waits = []
+    ev_ids = set()
+    for log in logs:
+        ev_ids.add(log["ev_id"])
+        key = (log["ev_id"], log["day"])
+        if log["event"] == "requesting charger":
+            requested[key] = log["time"]
+        elif log["event"] == "starts charging" and key in requested:
+            # Queue wait: time from requesting a charger until charging starts
+            waits.append(log["time"] - requested.pop(key))
+
+    waits = np.array(waits) / 60  # Queue wait in hours
+    return {
+        "service_rate": float(service_rate),
+        "servers": int(servers),
+        "ev_count": len(ev_ids),
+        "wq_hours": float(waits.mean()) if len(waits) else 0.0,
+        "prob_wait": float((waits > 0).mean()) if len(waits) else 0.0,
+        "n_waits": len(waits)
+    }
+
+def simulate_replications(service_rate, servers, ev_count, indices, sim_days=None, power_kw=None):
+    """
+    Run replications of a scenario in memory and summarize them, nothing is written under logs/.
+
+    :param service_rate: The charger service rate (mean charging time in hours).
+    :param servers: The number of chargers.
+    :param ev_count: Number of EVs in the fleet.
+    :param indices: The replication indices to run (each index seeds its own replication).
+    :param sim_days: Number of workdays per EV, SIM_DAYS by default.
+    :param power_kw: Charger power for the battery model, None to charge by service rate.
+    :return: List of run summaries (see summarize_run), in the order of `indices`.
+    """
+    model = load_model()
+    sim_days = sim_days or model.SIM_DAYS
+    charger_type = model.ChargerAttributes(service_rate, servers, power_kw=power_kw)
+
+    summaries = []
+    for index in indices:
+        # Reset the global EV logs for each replication
+        model.ev_logs = []
+        env, fleet = model.create_environment(index + 1, charger_type, ev_count, sim_days=sim_days)
+        model.run_environment(env, RunInstrumentation(enabled=False))
+
+        summary = summarize_run(model.ev_logs, service_rate, servers)
+        summary["replication"] = index
+        summaries.append(summary)
+    return summaries
+
+def summarize_log_file(path):
+    """
+    Summarize a log file written by run_simulation.
+
+    Runs of the battery model (chargers with a power rating, saved with a "_fleet.npz" next to
+    the log) are skipped: their charging times follow the battery state, not the service rate.
+
+    :param path: Path of the log file.
+    :return: The run summary (see summarize_run), or None if the file name does not match
+        or the run used the battery model.
+    """
+    match = LOG_FILE_PATTERN.search(os.path.basename(path))
+    if not match or os.path.exists(path.replace("_logs.json", "_fleet.npz")):
+        return None
+    with open(path, "r") as f:
+        logs = json.load(f)
+    summary = summarize_run(logs, service_rate=match.group(3), servers=match.group(4))
+    summary["source_file"] = os.path.basename(path)
+    return summary
+
+def summarize_log_directory(log_directory="logs"):
+    """
+    Summarize all log files of a directory.
+
+    :param log_directory: Directory with the "_logs.json" files.
+    :return: List of run summaries.
+    """
+    summaries = []
+    for file in sorted(os.listdir(log_directory)):
+        summary = summarize_log_file(os.path.join(log_directory, file))
+        if summary:
+            summaries.append(summary)
+    return summaries
+
+class SurrogateModel:
+    def __init__(self, cache_file=os.path.join("logs", "surrogate_runs.json"), length_scale=0.5, signal_var=1.0,
+                 max_wq_std=0.25, max_prob_wait_std=0.05):
+        """
+        Initialize the SurrogateModel class.
+
+        A zero-mean Gaussian process over (log service rate, log chargers, log fleet size) is fitted
+        to the residuals of the replication summaries against the Erlang C prior, separately for the
+        log queue wait and the logit probability of waiting. Away from the data the prediction
+        falls back to the prior with the full prior uncertainty.
+
+        :param cache_file: JSON file where the replication summaries are accumulated.
+        :param length_scale: Kernel length scale in log-parameter space.
+        :param signal_var: Prior variance of the residuals on the transformed scale.
+        :param max_wq_std: Largest acceptable standard deviation of log1p E[Wq] before falling back to simulation
+            (relative to 1 + E[Wq], 0.25 is roughly +-25%).
+        :param max_prob_wait_std: Largest acceptable standard deviation of P(wait) before falling back to simulation.
+        """
+        self.cache_file = cache_file
+        self.length_scale = length_scale
+        self.signal_var = signal_var
+        self.max_wq_std = max_wq_std
+        self.max_prob_wait_std = max_prob_wait_std
+        self.summaries = []
+        self._fitted = {}  # Target name -> fitted GP arrays
+
+        # Load the accumulated replication summaries
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                self.summaries = json.load(f)
+        self.fit()
+
+    def _features(self, service_rate, servers, ev_count):
+        return np.log(np.array([service_rate, servers, ev_count], dtype=float)) / self.length_scale
+
+    def prior(self, service_rate, servers, ev_count):
+        """
+        Get the Erlang C prior for a scenario on the transformed scale.
+
+        :param service_rate: The charger service rate (mean charging time in hours).
+        :param servers: The number of chargers.
+        :param ev_count: Number of EVs in the fleet.
+        :return: Tuple of (log1p E[Wq], logit P(wait)).
+        """
+        # Fleet arrival rate (arrivals/hr): every EV requests a charger once per workday
+        lambda_rate = ev_count / 24
+        mu_rate = 1 / service_rate
+        # Saturated wait: an EV waits on average for half the fleet to be charged ahead of it
+        saturated_wq = ev_count / (2 * servers * mu_rate)
+        if lambda_rate / (servers * mu_rate) >= 1:
+            # Overloaded M/M/c, the Erlang C formula does not apply: every EV waits the saturated wait
+            return math.log1p(saturated_wq), float(_logit(1.0))
+
+        metrics = erlang_c_metrics(lambda_rate, mu_rate, int(servers))
+        # E[Wq] of Erlang C diverges as the utilization approaches 1, cap it at the saturated wait
+        wq = min(metrics["E[Wq] (hrs)"], saturated_wq)
+        return math.log1p(wq), _logit(metrics["ErlangC_Prob_Wait"])
+
+    def add(self, summaries):
+        """
+        Add replication summaries, refit the model and update the cache file.
+
+        :param summaries: List of run summaries (see summarize_run).
+        """
+        known = {s.get("source_file") for s in self.summaries if s.get("source_file")}
+        self.summaries.extend(s for s in summaries if not s.get("source_file") or s["source_file"] not in known)
+        self.fit()
+
+        if self.cache_file:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            with open(self.cache_file, "w") as f:
+                json.dump(self.summaries, f)
+
+    def fit(self):
+        """Fit the Gaussian processes to the accumulated summaries."""
+        self._fitted = {}
+        if not self.summaries:
+            return
+
+        X = np.array([self._features(s["service_rate"], s["servers"], s["ev_count"]) for s in self.summaries])
+        priors = np.array([self.prior(s["service_rate"], s["servers"], s["ev_count"]) for s in self.summaries])
+        targets = {
+            "wq": np.log1p([s["wq_hours"] for s in self.summaries]) - priors[:, 0],
+            "prob_wait": _logit(np.array([s["prob_wait"] for s in self.summaries])) - priors[:, 1]
+        }
+
+        # Replication noise: pooled variance of runs sharing the same scenario parameters
+        groups = defaultdict(list)
+        for i, s in enumerate(self.summaries):
+            groups[(s["service_rate"], s["servers"], s["ev_count"])].append(i)
+
+        sq_dist = np.sum((X[:, None, :] - X[None, :, :]) ** 2, axis=-1)
+        for name, y in targets.items():
+            within = [np.var(y[idx], ddof=1) for idx in groups.values() if len(idx) > 1]
+            noise = max(np.mean(within) if within else 0.0, 1e-6)
+
+            # Fixed signal variance, so a scenario far from the data keeps the prior uncertainty
+            K = self.signal_var * np.exp(-0.5 * sq_dist) + noise * np.eye(len(y))
+            K_inv = np.linalg.inv(K)
+            self._fitted[name] = {
+                "alpha": K_inv @ y,
+                "K_inv": K_inv,
+                "X": X
+            }
+
+    def _predict(self, name, x, prior):
+        fitted = self._fitted.get(name)
+        if fitted is None:
+            # Nothing learned yet, only the prior
+            return prior, math.sqrt(self.signal_var)
+
+        k = self.signal_var * np.exp(-0.5 * np.sum((fitted["X"] - x) ** 2, axis=1))
+        mean = prior + k @ fitted["alpha"]
+        var = max(self.signal_var - k @ fitted["K_inv"] @ k, 0.0)
+        return mean, math.sqrt(var)
+
+    def predict(self, service_rate, servers, ev_count):
+        """
+        Predict the queue performance of a scenario.
+
+        :param service_rate: The charger service rate (mean charging time in hours).
+        :param servers: The number of chargers.
+        :param ev_count: Number of EVs in the fleet.
+        :return: Dictionary with E[Wq] (hours), P(wait) and their standard deviations.
+        """
+        x = self._features(service_rate, servers, ev_count)
+        wq_prior, pw_prior = self.prior(service_rate, servers, ev_count)
+        wq_t, wq_t_std = self._predict("wq", x, wq_prior)
+        pw_t, pw_t_std = self._predict("prob_wait", x, pw_prior)
+
+        # Transform back, the standard deviations use the delta method
+        wq = math.expm1(wq_t)
+        pw = _expit(pw_t)
+        return {
+            "service_rate": service_rate,
+            "servers": servers,
+            "ev_count": ev_count,
+            "E[Wq] (hrs)": max(wq, 0.0),
+            "E[Wq] std (hrs)": (wq + 1) * wq_t_std,
+            "log1p E[Wq] std": wq_t_std,
+            "Prob_Wait": pw,
+            "Prob_Wait std": pw * (1 - pw) * pw_t_std,
+            "n_observations": len(self.summaries)
+        }
+
+    def query(self, service_rate, servers, ev_count, sim_runs=5, simulate=True):
+        """
+        Answer a what-if query, falling back to simulation when the uncertainty is too high.
+
+        The fallback replications run in memory (see simulate_replications) and are added to the
+        model, so the next query near the same scenario is answered by the surrogate.
+
+        :param service_rate: The charger service rate (mean charging time in hours).
+        :param servers: The number of chargers.
+        :param ev_count: Number of EVs in the fleet.
+        :param sim_runs: Number of replications to run on fallback.
+        :param simulate: Allow falling back to simulation.
+        :return: The prediction (see predict), with "simulated" set if a fallback was run.
+        """
+        prediction = self.predict(service_rate, servers, ev_count)
+        prediction["simulated"] = False
+        if not simulate or (prediction["log1p E[Wq] std"] <= self.max_wq_std
+                            and prediction["Prob_Wait std"] <= self.max_prob_wait_std):
+            return prediction
+
+        # Continue the replication indices of the cached runs of this scenario, so every run has its own seed
+        scenario = (float(service_rate), int(servers), int(ev_count))
+        cached = sum(1 for s in self.summaries if (s["service_rate"], s["servers"], s["ev_count"]) == scenario)
+        self.add(simulate_replications(service_rate, servers, ev_count, range(cached, cached + sim_runs)))
+
+        prediction = self.predict(service_rate, servers, ev_count)
+        prediction["simulated"] = True
+        return prediction
+
+def _logit(p, eps=1e-3):
+    p = np.clip(p, eps, 1 - eps)
+    return np.log(p / (1 - p))
+
+def _expit(x):
+    return 1 / (1 + math.exp(-x))
+
+if __name__ == "__main__":
+    # Seed the surrogate with the replications already in logs/ and answer an example query
+    surrogate = SurrogateModel()
+    if os.path.isdir("logs"):
+        surrogate.add(summarize_log_directory("logs"))
+    print(surrogate.query(service_rate=2.85, servers=2, ev_count=30))
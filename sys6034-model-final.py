@@ -1,9 +1,11 @@
 import simpy
+import numpy as np
 import uuid
 import random
 import time
 import os
 import json  # Import JSON module for file writing
+from instrumentation import RunInstrumentation
 
 # Total EVs
 EVS = 30
@@ -12,6 +14,12 @@ EVS = 30
 SIM_DAYS = 54 # Total simulation days
 SIM_TIME = SIM_DAYS * 24 * 60  # Total simulation time in minutes
 
+# Estimation mode: "replications" runs SIM_RUNS independent runs per scenario,
+# "steady_state" runs one long run per scenario and estimates with warm-up deletion and batch means
+ESTIMATION_MODE = "replications"
+SIM_RUNS = 20 # Independent runs per scenario in "replications" mode
+STEADY_STATE_DAYS = SIM_DAYS * 10 # Length of the single long run in "steady_state" mode
+
 # Use seed for random number generation
 USE_SEED = False
 
@@ -22,6 +30,13 @@ WORKDAY_END = 1260     # 9 PM
 # Get print outputs
 VERBOSE = True
 
+# Instrumentation (written next to the logs). The profilers distort the phase timings,
+# so each one is switched on separately
+TIMING = False  # Per-phase timings and event counts in a run manifest
+PROFILE = False  # Per-replication cProfile snapshot, the only split of the simulate phase into
+                 # delivery/charging time sampling, log_ev_event and the VERBOSE prints
+TRACE_MEMORY = False  # Per-replication tracemalloc snapshot
+
 # Rates
 # Service rate for each charger type, mean duration in hours (derived from the kaggle dataset)
 L1 = 2.119910 
@@ -30,6 +45,22 @@ L3 = 2.393660
 # Arrival rate
 LAMBDA_ARRIVAL = 10.375 # Average arrival rate of EVs per hour (derived from the kaggle dataset)
 
+# Battery model (used when a charger has a power rating, see ChargerAttributes.power_kw)
+BATTERY_CAPACITY = 100  # Battery capacity in kWh
+EFFICIENCY = 0.2  # % of the battery used per mile
+# The prototype had TARGET_CHARGE = 75 and THRESHOLD_CHARGE = 80, which charges EVs below 80% only up to 75%.
+# Swapped so the charging target lies above the holding threshold
+TARGET_CHARGE = 80  # EVs are charged up to this % (the "charge to 80%" scenarios)
+THRESHOLD_CHARGE = 75  # EVs at or above this % after delivery skip charging and go to holding
+INITIAL_CHARGE = 100.0  # State of charge (%) of every EV at the start of the run
+
+# Delivery types, miles driven per workday (uniform between the bounds)
+DELIVERY_TYPES = {
+    "short": (0, 25),
+    "medium": (25, 50),
+    "long": (50, 75)
+}
+
 # Global list to store EV logs
 ev_logs = []
 
@@ -55,15 +86,18 @@ def log_ev_event(ev_id, time, current_day, event, extra=None):
     })
 
 class ChargerAttributes:
-    def __init__(self, service_rate, servers):
+    def __init__(self, service_rate, servers, power_kw=None):
         """
         Initialize the ChargerAttributes class.
 
         :param service_rate: The average service rate (charging rate) of the charger.
         :param servers: The number of chargers available (capacity).
+        :param power_kw: Charger power in kW. If set, the battery model is used and the
+            charging time follows from the state of charge deficit instead of the service rate.
         """
         self.service_rate = service_rate  # Average service rate of the charger
         self.servers = servers  # Number of chargers available
+        self.power_kw = power_kw  # Charger power, None for service rate based charging
 
     def rate(self):
         """
@@ -98,7 +132,135 @@ class ChargerAttributes:
             if min_charge_time <= charge_time <= max_charge_time:
                 return charge_time
 
-def ev(env, uuid: uuid, chargers, charger_type: ChargerAttributes):
+    def energy_charging_time(self, energy_kwh):
+        """
+        Calculate the charging time needed to deliver an amount of energy.
+
+        :param energy_kwh: The energy to deliver in kWh.
+        :return: The charging time in minutes.
+        """
+        return energy_kwh / self.power_kw * 60
+
+class FleetState:
+    def __init__(self, ev_count, rng: np.random.Generator):
+        """
+        Initialize the FleetState class.
+
+        The battery state of the whole fleet is kept in NumPy arrays indexed by EV,
+        instead of one Python object per EV. Only per-EV state is stored: the delivery
+        miles of a workday are drawn for the whole fleet when the first EV needs them
+        and dropped once every EV has driven that day.
+
+        :param ev_count: Number of EVs in the fleet.
+        :param rng: NumPy random generator for the delivery miles.
+        """
+        self.ev_count = ev_count
+        self.rng = rng
+        self.soc = np.full(ev_count, INITIAL_CHARGE)  # State of charge in %
+        self.miles = np.zeros(ev_count)  # Total miles driven
+        self.unserved_miles = np.zeros(ev_count)  # Delivery miles not driven because the battery ran flat
+        self.energy_delivered = np.zeros(ev_count)  # Total energy charged in kWh
+        self._bounds = np.array(list(DELIVERY_TYPES.values()), dtype=float)
+        self._day_miles = {}  # Workday -> [delivery miles of every EV, EVs that have not driven it yet]
+
+    def _miles(self, index, current_day):
+        # Draw the delivery type and miles of every EV for the workday in one vectorized step
+        if current_day not in self._day_miles:
+            delivery_type = self.rng.integers(0, len(self._bounds), size=self.ev_count)
+            miles = self.rng.uniform(self._bounds[delivery_type, 0], self._bounds[delivery_type, 1])
+            self._day_miles[current_day] = [miles, self.ev_count]
+
+        entry = self._day_miles[current_day]
+        entry[1] -= 1
+        if entry[1] == 0:
+            # Every EV has driven this workday, release its row
+            del self._day_miles[current_day]
+        return entry[0][index]
+
+    def drive(self, index, current_day):
+        """
+        Apply the delivery of a workday to an EV.
+
+        Only the miles are drawn per workday for the whole fleet, the state of charge is updated
+        per EV when it returns: the EV processes start their workdays one by one and EVs held at
+        the chargers past WORKDAY_START skip a day, so the departing EVs are not known as a group.
+
+        :param index: The index of the EV in the fleet arrays.
+        :param current_day: The workday of the EV.
+        :return: Tuple of (state of charge after the delivery, miles not driven because the battery ran flat).
+        """
+        miles = self._miles(index, current_day)
+        consumption = miles * EFFICIENCY  # Battery consumption in % of capacity
+        unserved = 0.0
+        if consumption > self.soc[index]:
+            # The battery runs flat during the delivery, the rest of the route is not driven
+            unserved = (consumption - self.soc[index]) / EFFICIENCY
+            miles -= unserved
+            consumption = self.soc[index]
+            self.unserved_miles[index] += unserved
+
+        self.miles[index] += miles
+        self.soc[index] -= consumption
+        return self.soc[index], unserved
+
+    def charging_energy(self, index):
+        """
+        Get the energy needed to bring an EV up to TARGET_CHARGE.
+
+        :param index: The index of the EV in the fleet arrays.
+        :return: The energy in kWh.
+        """
+        return max(0.0, TARGET_CHARGE - self.soc[index]) * BATTERY_CAPACITY / 100
+
+    def charge(self, index, energy_kwh):
+        """
+        Add charged energy to an EV.
+
+        :param index: The index of the EV in the fleet arrays.
+        :param energy_kwh: The energy delivered in kWh.
+        :return: The state of charge after charging.
+        """
+        self.energy_delivered[index] += energy_kwh
+        self.soc[index] = min(100.0, self.soc[index] + energy_kwh / BATTERY_CAPACITY * 100)
+        return self.soc[index]
+
+    def save(self, output_file):
+        """
+        Save the fleet arrays to a NumPy .npz file.
+
+        :param output_file: The output file path.
+        """
+        np.savez(output_file, soc=self.soc, miles=self.miles, unserved_miles=self.unserved_miles,
+                 energy_delivered=self.energy_delivered)
+
+def battery_charging_time(env, charger_type: ChargerAttributes, energy_kwh):
+    """
+    Calculate the charging time from the energy needed and the charger power.
+    EVs charge overnight, charging that would cross the start of the next workday
+    is stopped early and the remaining deficit carries over to the next charge.
+
+    :param env: SimPy environment.
+    :param charger_type: ChargerAttributes object with a power rating.
+    :param energy_kwh: The energy needed in kWh.
+    :return: Tuple of (charging time in minutes, energy delivered in kWh).
+    """
+    charge_time = charger_type.energy_charging_time(energy_kwh)
+    current_minute = env.now % 1440
+
+    # Minutes until the EV leaves for the next workday (same rule as wait_until_next_day)
+    if current_minute < WORKDAY_START:
+        window = WORKDAY_START - current_minute
+    else:
+        window = (1440 - current_minute) + WORKDAY_START
+
+    # If charging crosses the start of the next workday, stop early
+    if charge_time > window:
+        charge_time = window
+        energy_kwh = charger_type.power_kw * charge_time / 60
+
+    return charge_time, energy_kwh
+
+def ev(env, uuid: uuid, chargers, charger_type: ChargerAttributes, sim_days=SIM_DAYS, fleet: FleetState = None, index=None):
     """
     Simulate the behavior of an EV in the system.
 
@@ -106,9 +268,12 @@ def ev(env, uuid: uuid, chargers, charger_type: ChargerAttributes):
     :param uuid: Unique identifier for the EV.
     :param chargers: SimPy resource representing the chargers.
     :param charger_type: ChargerAttributes object specifying charger properties.
+    :param sim_days: Number of workdays the EV operates.
+    :param fleet: FleetState with the battery arrays, None to charge by service rate.
+    :param index: The index of the EV in the fleet arrays.
     """
     current_day = 0  # Initialize the current simulation day
-    while current_day < SIM_DAYS:  # Loop through each simulation day
+    while current_day < sim_days:  # Loop through each simulation day
 
         if current_day == 0:
             # On the first day, wait until the workday starts
@@ -125,6 +290,21 @@ def ev(env, uuid: uuid, chargers, charger_type: ChargerAttributes):
         log_ev_event(uuid, env.now, current_day, "Delivery", {"return_delay": return_delay})
         yield env.timeout(return_delay)  # Wait for the delivery time to elapse
 
+        if fleet is not None:
+            # Apply the battery consumption of the delivery
+            soc, unserved = fleet.drive(index, current_day)
+            if unserved > 0:
+                # The battery ran flat during the delivery
+                if VERBOSE: print(f"{uuid}: Battery depleted, {unserved:.1f} miles not delivered")
+                log_ev_event(uuid, env.now, current_day, "battery depleted", {"unserved_miles": unserved})
+            if soc >= THRESHOLD_CHARGE:
+                # Enough charge left, go to holding until the next workday
+                if VERBOSE: print(f"{uuid}: Goes to holding (Battery: {soc:.1f}%)")
+                log_ev_event(uuid, env.now, current_day, "holding", {"soc": soc})
+                yield from wait_until_next_day(env, uuid, current_day)
+                current_day += 1
+                continue
+
         # Request access to a charger
         with chargers.request() as req:
             queue_len = len(chargers.queue)  # Get the current queue length
@@ -137,17 +317,27 @@ def ev(env, uuid: uuid, chargers, charger_type: ChargerAttributes):
             # Log the start of the charging event
             log_ev_event(uuid, env.now, current_day, "starts charging")
             
-            # Determine the charging time based on the charger type
-            charging_time = charger_type.charging_time(min_charge_time=5, max_charge_time=2880)
-            # Log the charging event with the calculated charging time
-            log_ev_event(uuid, env.now, current_day, "charging", {"charging_time": charging_time})
+            if fleet is not None:
+                # Determine the charging time from the state of charge deficit and the charger power
+                soc = fleet.soc[index]
+                charging_time, energy = battery_charging_time(env, charger_type, fleet.charging_energy(index))
+                if charging_time > 0:
+                    log_ev_event(uuid, env.now, current_day, "charging", {"charging_time": charging_time, "soc": soc, "energy_kwh": energy})
+            else:
+                # Determine the charging time based on the charger type
+                charging_time = charger_type.charging_time(min_charge_time=5, max_charge_time=2880)
+                # Log the charging event with the calculated charging time
+                log_ev_event(uuid, env.now, current_day, "charging", {"charging_time": charging_time})
 
             if VERBOSE: print(f"{uuid}: Charging for {charging_time:.2f} minutes")
             yield env.timeout(charging_time)  # Wait for the charging time to elapse
 
             if VERBOSE: print(f"{uuid}: Finished charging")
             # Log the completion of the charging event
-            log_ev_event(uuid, env.now, current_day, "finished charging")
+            if fleet is not None:
+                log_ev_event(uuid, env.now, current_day, "finished charging", {"soc": fleet.charge(index, energy)})
+            else:
+                log_ev_event(uuid, env.now, current_day, "finished charging")
         
         # Wait until the next workday starts
         yield from wait_until_next_day(env, uuid, current_day)
@@ -204,7 +394,75 @@ def day(sim_time):
     current_day = int(sim_time / 1440) + 1  # Convert simulation time to days
     return current_day
 
-def run_simulation(sim_id, sim_runs, charger_type: ChargerAttributes, ev_count, sim_time, verbose=False):
+def run_environment(env, instrument: RunInstrumentation):
+    """
+    Run the SimPy environment until no events remain.
+
+    :param env: SimPy environment.
+    :param instrument: RunInstrumentation used to count the processed events.
+    """
+    if not instrument.enabled:
+        env.run(until=None)
+        return
+
+    # Step through the schedule manually so the number of processed events can be recorded
+    events = 0
+    try:
+        while True:
+            env.step()
+            events += 1
+    except simpy.core.EmptySchedule:
+        pass
+    instrument.add_events("simulate", events)
+
+def create_environment(sim_id, charger_type: ChargerAttributes, ev_count, sim_days=SIM_DAYS, verbose=False):
+    """
+    Create a SimPy environment with the chargers and EV processes of one run.
+
+    :param sim_id: The simulation (scenario) ID.
+    :param charger_type: ChargerAttributes object specifying charger properties.
+    :param ev_count: Number of EVs in the fleet.
+    :param sim_days: Number of workdays each EV operates.
+    :param verbose: Print setup progress.
+    :return: Tuple of (SimPy environment ready to run, FleetState or None without the battery model).
+    """
+    # Set a random seed for reproducibility if enabled
+    if USE_SEED:
+        random.seed(2511 + sim_id)  # Ensure different seeds for different simulations
+
+    # Shared battery arrays of the fleet, only when the chargers have a power rating
+    fleet = None
+    if charger_type.power_kw is not None:
+        fleet = FleetState(ev_count, np.random.default_rng(2511 + sim_id if USE_SEED else None))
+    
+    # Create a new SimPy environment for the simulation
+    env = simpy.Environment()
+
+    # Create a resource for chargers with the specified capacity
+    chargers = simpy.Resource(env, capacity=charger_type.capacity())
+    if verbose: print(f"[Sim {sim_id}] Created chargers with type: {charger_type}")
+
+    # Create EV processes and add them to the simulation environment
+    for index in range(ev_count):
+        ev_uuid = uuid.uuid4()  # Generate a unique identifier for each EV
+        if verbose: print(f"[Sim {sim_id}] Creating EV with UUID: {ev_uuid}")
+        env.process(ev(env, ev_uuid, chargers, charger_type, sim_days, fleet, index))  # Add EV process to the environment
+
+    return env, fleet
+
+def run_simulation(sim_id, sim_runs, charger_type: ChargerAttributes, ev_count, sim_time, verbose=False, instrument: RunInstrumentation = None):
+    # Instrumentation is opt-in, a disabled instance records nothing
+    if instrument is None:
+        instrument = RunInstrumentation(enabled=False)
+    instrument.parameters[f"simulation_{sim_id}"] = {
+        "sim_runs": sim_runs,
+        "service_rate": charger_type.service_rate,
+        "servers": charger_type.servers,
+        "ev_count": ev_count,
+        "sim_time": sim_time
+    }
+
+    output_files = []  # Log files written by this simulation
     for i in range(sim_runs):
         if verbose: print(f"[Sim {sim_id}] Starting simulation run {i + 1}/{sim_runs}")
         
@@ -212,67 +470,135 @@ def run_simulation(sim_id, sim_runs, charger_type: ChargerAttributes, ev_count,
         global ev_logs
         ev_logs = []
 
-        # Set a random seed for reproducibility if enabled
-        if USE_SEED:
-            random.seed(2511 + sim_id)  # Ensure different seeds for different simulations
-        
-        # Create a new SimPy environment for the simulation
-        env = simpy.Environment()
+        with instrument.replication(f"simulation_{sim_id}_run_{i+1}"):
+            with instrument.phase("setup"):
+                env, fleet = create_environment(sim_id, charger_type, ev_count, verbose=verbose)
 
-        # Create a resource for chargers with the specified capacity
-        chargers = simpy.Resource(env, capacity=charger_type.capacity())
-        if verbose: print(f"[Sim {sim_id}] Created chargers with type: {charger_type}")
+            # Run the simulation until the specified simulation time
+            with instrument.phase("simulate"):
+                run_environment(env, instrument)
+            instrument.count("logged_events", len(ev_logs))
+            if verbose: print(f"[Sim {sim_id}] Simulation completed.")
+            if verbose: print(f"[Sim {sim_id}] Simulation ended at time: {env.now}")
 
-        # Create EV processes and add them to the simulation environment
-        for _ in range(ev_count):
-            ev_uuid = uuid.uuid4()  # Generate a unique identifier for each EV
-            if verbose: print(f"[Sim {sim_id}] Creating EV with UUID: {ev_uuid}")
-            env.process(ev(env, ev_uuid, chargers, charger_type))  # Add EV process to the environment
+            # Save the simulation logs to a JSON file
+            start_time = time.time()  # Record the start time for log saving
+            
+            # Define the output file path for the logs
+            output_file = f"logs/simulation_{sim_id}_run_{i+1}_mu_{charger_type.service_rate}_cap_{charger_type.servers}_logs.json"
+            with instrument.phase("serialize"):
+                os.makedirs("logs", exist_ok=True)  # Ensure the logs directory exists
+                with open(output_file, "w") as f:
+                    json.dump(ev_logs, f)  # Write the logs to the JSON file
+                # Save the fleet battery arrays next to the logs
+                if fleet is not None:
+                    fleet.save(output_file.replace("_logs.json", "_fleet.npz"))
+            output_files.append(output_file)
+            instrument.add_events("serialize", len(ev_logs))
+            
+            end_time = time.time()  # Record the end time for log saving
+            real_world_duration = end_time - start_time  # Calculate the duration of the log saving process
+            
+            # Print verbose output for log saving and simulation duration
+            if verbose: 
+                print(f"[Sim {sim_id}] Logs saved to {output_file}")
+                print(f"[Sim {sim_id}] Real-world simulation duration: {real_world_duration:.2f} seconds")
 
-        # Run the simulation until the specified simulation time
-        env.run(until=None)
-        if verbose: print(f"[Sim {sim_id}] Simulation completed.")
+    # Write the run manifest next to the logs
+    manifest_file = instrument.write_manifest(f"simulation_{sim_id}_manifest.json")
+    if verbose and manifest_file: print(f"[Sim {sim_id}] Run manifest saved to {manifest_file}")
+
+    return output_files
+
+def run_steady_state_simulation(sim_id, charger_type: ChargerAttributes, ev_count, sim_days=STEADY_STATE_DAYS, verbose=False, instrument: RunInstrumentation = None):
+    """
+    Run one long replication of a scenario for steady-state estimation.
+
+    The warm-up period and the batch means are handled in the analysis
+    (plotting.calculate_steady_state_rates_by_scenario), so the full run is logged.
+    Logs go to logs/steady_state so they are not mixed with the independent replications.
+
+    :param sim_id: The simulation (scenario) ID.
+    :param charger_type: ChargerAttributes object specifying charger properties.
+    :param ev_count: Number of EVs in the fleet.
+    :param sim_days: Number of workdays in the long run.
+    :param verbose: Print progress.
+    :param instrument: Optional RunInstrumentation for phase timings.
+    """
+    if instrument is None:
+        instrument = RunInstrumentation(enabled=False)
+    instrument.parameters[f"simulation_{sim_id}"] = {
+        "service_rate": charger_type.service_rate,
+        "servers": charger_type.servers,
+        "ev_count": ev_count,
+        "sim_days": sim_days
+    }
+
+    if verbose: print(f"[Sim {sim_id}] Starting steady-state run of {sim_days} days")
+
+    # Reset the global EV logs for the run
+    global ev_logs
+    ev_logs = []
+
+    with instrument.replication(f"simulation_{sim_id}_steady_state"):
+        with instrument.phase("setup"):
+            env, fleet = create_environment(sim_id, charger_type, ev_count, sim_days=sim_days, verbose=verbose)
+
+        with instrument.phase("simulate"):
+            run_environment(env, instrument)
+        instrument.count("logged_events", len(ev_logs))
         if verbose: print(f"[Sim {sim_id}] Simulation ended at time: {env.now}")
 
-        # Save the simulation logs to a JSON file
-        start_time = time.time()  # Record the start time for log saving
-        
-        # Define the output file path for the logs
-        output_file = f"logs/simulation_{sim_id}_run_{i+1}_mu_{charger_type.service_rate}_cap_{charger_type.servers}_logs.json"
-        os.makedirs("logs", exist_ok=True)  # Ensure the logs directory exists
-        with open(output_file, "w") as f:
-            json.dump(ev_logs, f)  # Write the logs to the JSON file
-        
-        end_time = time.time()  # Record the end time for log saving
-        real_world_duration = end_time - start_time  # Calculate the duration of the log saving process
-        
-        # Print verbose output for log saving and simulation duration
-        if verbose: 
-            print(f"[Sim {sim_id}] Logs saved to {output_file}")
-            print(f"[Sim {sim_id}] Real-world simulation duration: {real_world_duration:.2f} seconds")
+        # Keep the replication file naming so the analysis groups the run by scenario
+        output_file = os.path.join("logs", "steady_state", f"simulation_{sim_id}_run_1_mu_{charger_type.service_rate}_cap_{charger_type.servers}_logs.json")
+        with instrument.phase("serialize"):
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            with open(output_file, "w") as f:
+                json.dump(ev_logs, f)
+            if fleet is not None:
+                fleet.save(output_file.replace("_logs.json", "_fleet.npz"))
+        instrument.add_events("serialize", len(ev_logs))
+
+    if verbose: print(f"[Sim {sim_id}] Logs saved to {output_file}")
+    instrument.write_manifest(f"simulation_{sim_id}_steady_state_manifest.json")
 
 def main():
     # Define simulation parameters
     simulations = [
-        {"sim_id": 1, "sim_runs": 20, "charger_type": ChargerAttributes(L1,1), "ev_count": EVS, "sim_time": SIM_TIME},
-        {"sim_id": 2, "sim_runs": 20, "charger_type": ChargerAttributes(L2,1), "ev_count": EVS, "sim_time": SIM_TIME},
-        {"sim_id": 3, "sim_runs": 20, "charger_type": ChargerAttributes(L3,1), "ev_count": EVS, "sim_time": SIM_TIME},
-        {"sim_id": 4, "sim_runs": 20, "charger_type": ChargerAttributes(20.0,1), "ev_count": EVS, "sim_time": SIM_TIME}, # A more realistic level 1 charge to 80%
-        {"sim_id": 5, "sim_runs": 20, "charger_type": ChargerAttributes(2.85,1), "ev_count": EVS, "sim_time": SIM_TIME}, # A more realistic level 2 charge to 80%
-        {"sim_id": 6, "sim_runs": 20, "charger_type": ChargerAttributes(0.5,1), "ev_count": EVS, "sim_time": SIM_TIME}, # A more realistic level 3 charge to 80%
-        {"sim_id": 7, "sim_runs": 20, "charger_type": ChargerAttributes(2.85,4), "ev_count": EVS, "sim_time": SIM_TIME},
-        {"sim_id": 8, "sim_runs": 20, "charger_type": ChargerAttributes(2.85,8), "ev_count": EVS, "sim_time": SIM_TIME},
+        {"sim_id": 1, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(L1,1), "ev_count": EVS, "sim_time": SIM_TIME},
+        {"sim_id": 2, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(L2,1), "ev_count": EVS, "sim_time": SIM_TIME},
+        {"sim_id": 3, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(L3,1), "ev_count": EVS, "sim_time": SIM_TIME},
+        {"sim_id": 4, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(20.0,1), "ev_count": EVS, "sim_time": SIM_TIME}, # A more realistic level 1 charge to 80%
+        {"sim_id": 5, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(2.85,1), "ev_count": EVS, "sim_time": SIM_TIME}, # A more realistic level 2 charge to 80%
+        {"sim_id": 6, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(0.5,1), "ev_count": EVS, "sim_time": SIM_TIME}, # A more realistic level 3 charge to 80%
+        {"sim_id": 7, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(2.85,4), "ev_count": EVS, "sim_time": SIM_TIME},
+        {"sim_id": 8, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(2.85,8), "ev_count": EVS, "sim_time": SIM_TIME},
+        {"sim_id": 9, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(2.85,1,power_kw=7.2), "ev_count": EVS, "sim_time": SIM_TIME}, # Level 2 with the battery model, charge time from SoC deficit
+        {"sim_id": 10, "sim_runs": SIM_RUNS, "charger_type": ChargerAttributes(0.5,1,power_kw=50.0), "ev_count": EVS, "sim_time": SIM_TIME}, # Level 3 with the battery model, charge time from SoC deficit
     ]
 
     # Run simulations
+    instrumented = TIMING or PROFILE or TRACE_MEMORY
     for sim in simulations:
+        if ESTIMATION_MODE == "steady_state":
+            run_steady_state_simulation(
+                sim_id=sim["sim_id"],
+                charger_type=sim["charger_type"],
+                ev_count=sim["ev_count"],
+                sim_days=STEADY_STATE_DAYS,
+                verbose=VERBOSE,
+                instrument=RunInstrumentation(profile=PROFILE, trace_memory=TRACE_MEMORY) if instrumented else None
+            )
+            continue
+
         run_simulation(
             sim_id=sim["sim_id"],
             sim_runs=sim["sim_runs"],
             charger_type=sim["charger_type"],
             ev_count=sim["ev_count"],
             sim_time=sim["sim_time"],
-            verbose=VERBOSE
+            verbose=VERBOSE,
+            instrument=RunInstrumentation(profile=PROFILE, trace_memory=TRACE_MEMORY) if instrumented else None
         )
 
 if __name__ == '__main__':